@@ -0,0 +1,218 @@
+"""Кэш в файле SQLite, общий для всех процессов одного сервера.
+
+``LocMemCache`` живёт в памяти процесса: у каждого WSGI-воркера свой
+холодный кэш, а сброс ключа в одном воркере не виден остальным. Этот
+бэкенд хранит записи в одном файле SQLite (режим WAL), поэтому все
+процессы видят одни и те же значения и версии тегов.
+
+Целые числа хранятся как INTEGER, поэтому ``incr``/``decr`` выполняются
+атомарным UPDATE в транзакции; остальные значения сериализуются pickle.
+При превышении ``MAX_ENTRIES`` вытесняются давно не читавшиеся записи
+(LRU). Запросы обходятся без UPSERT и RETURNING, поэтому бэкенд работает
+и с SQLite старше 3.24.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+# Условие «запись жива» для запросов; параметр — текущее время.
+ALIVE = '(expires IS NULL OR expires > ?)'
+# Время последнего чтения обновляется не чаще раза в секунду, чтобы
+# чтение горячих ключей не превращалось в запись.
+ACCESS_RESOLUTION = 1
+# Ключей в одном запросе IN (...): с параметром времени — меньше 999
+# переменных, которые допускают старые сборки SQLite.
+KEYS_PER_QUERY = 900
+
+
+class SQLiteCache(BaseCache):
+    # Проверять размер кэша раз в столько записей: COUNT(*) в SQLite
+    # проходит весь индекс.
+    cull_every = 32
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None,
+                check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            local.db, local.pid = db, os.getpid()
+        return local.db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _encode(self, value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache WHERE key = ? AND expires <= ?',
+                       (key, now))
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                (key, self._encode(value), self.get_backend_timeout(timeout),
+                 now))
+        self._written(1)
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        keys = list(names)
+        now = time.time()
+        found = {}
+        for start in range(0, len(keys), KEYS_PER_QUERY):
+            batch = keys[start:start + KEYS_PER_QUERY]
+            marks = ', '.join('?' * len(batch))
+            rows = self._db.execute(
+                f'SELECT key, value, accessed FROM cache'
+                f' WHERE key IN ({marks}) AND {ALIVE}',
+                (*batch, now)).fetchall()
+            stale = [key for key, _, accessed in rows
+                     if accessed < now - ACCESS_RESOLUTION]
+            if stale:
+                self._db.execute(
+                    'UPDATE cache SET accessed = ? WHERE key IN (%s)'
+                    % ', '.join('?' * len(stale)), (now, *stale))
+            found.update(
+                (names[key], self._decode(value)) for key, value, _ in rows)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        with self._transaction() as db:
+            db.executemany(
+                'REPLACE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                [(self._key(key, version), self._encode(value), expires, now)
+                 for key, value in data.items()])
+        self._written(len(data))
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()))
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key_name = self._key(key, version)
+        with self._transaction() as db:
+            cursor = db.execute(
+                f'UPDATE cache SET value = value + ? WHERE key = ?'
+                f" AND {ALIVE} AND typeof(value) = 'integer'",
+                (delta, key_name, time.time()))
+            if cursor.rowcount == 0:
+                raise ValueError("Key '%s' not found" % key)
+            return db.execute('SELECT value FROM cache WHERE key = ?',
+                              (key_name,)).fetchone()[0]
+
+    def has_key(self, key, version=None):
+        row = self._db.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time())).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._transaction() as db:
+            db.executemany(
+                'DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами потока.
+        pass
+
+    def _written(self, count):
+        self._writes += count
+        if self._writes >= self.cull_every:
+            self._writes = 0
+            self._cull()
+
+    def _cull(self):
+        """Удалить просроченные записи, а при переполнении — давно не
+        читавшиеся, оставив не больше ``MAX_ENTRIES``."""
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+            count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count <= self._max_entries:
+                return
+            if self._cull_frequency == 0:
+                db.execute('DELETE FROM cache')
+                return
+            excess = count - self._max_entries
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache'
+                ' ORDER BY accessed LIMIT ?)',
+                (max(excess, count // self._cull_frequency),))
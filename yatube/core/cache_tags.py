@@ -0,0 +1,79 @@
+"""Версии тегов кэша (surrogate keys).
+
+Закэшированный объект запоминает версии тегов, от которых зависит, и
+считается действительным, пока они не изменились. ``purge`` увеличивает
+версии тегов и тем самым сбрасывает ровно те объекты, что от них зависят.
+Заодно для каждого тега хранится время последнего изменения — из версий
+и времени строятся валидаторы ETag и Last-Modified.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from django.core.cache import cache
+
+KEY_PREFIX = 'cache_tags'
+MODIFIED_KEY_PREFIX = 'cache_tags_modified'
+
+
+def _key(tag, prefix=KEY_PREFIX):
+    # Слаги и имена пользователей могут содержать пробелы и не-ASCII.
+    return f'{prefix}:{quote(tag)}'
+
+
+def _initial():
+    # Версия, вытесненная из кэша, начинается заново с текущего времени,
+    # чтобы не совпасть ни с одной из уже выданных.
+    return int(time.time() * 1000)
+
+
+def versions(tags):
+    """Текущие версии тегов: словарь ``{тег: версия}``."""
+    keys = {_key(tag): tag for tag in tags}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _initial(), None)
+        cache.add(_key(keys[key], MODIFIED_KEY_PREFIX), time.time(), None)
+        found[key] = cache.get(key)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def version(tag):
+    return versions([tag])[tag]
+
+
+def purge(tags):
+    """Сделать недействительными объекты, зависящие от тегов."""
+    tags = list(tags)
+    for tag in tags:
+        try:
+            cache.incr(_key(tag))
+        except ValueError:
+            cache.add(_key(tag), _initial(), None)
+    now = time.time()
+    cache.set_many(
+        {_key(tag, MODIFIED_KEY_PREFIX): now for tag in tags}, None)
+
+
+def last_modified(tags):
+    """Время последнего изменения любого из тегов или None."""
+    keys = [_key(tag, MODIFIED_KEY_PREFIX) for tag in tags]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        return None
+    return datetime.fromtimestamp(max(found.values()), timezone.utc)
+
+
+def etag(tags, *extra):
+    """ETag по версиям тегов и дополнительным значениям (например,
+    пользователю, для которого отрисована страница)."""
+    payload = repr((sorted(versions(tags).items()), extra)).encode()
+    return hashlib.md5(payload).hexdigest()
+
+
+def tag_response(response, tag_versions):
+    """Пометить ответ тегами и версиями, на которых он построен."""
+    response.surrogate_keys = dict(tag_versions)
+    response['Surrogate-Key'] = ' '.join(sorted(tag_versions))
+    return response
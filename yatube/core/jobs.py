@@ -0,0 +1,59 @@
+"""Локальная очередь фоновых задач.
+
+Задачи выполняются потоком-воркером внутри процесса, после фиксации
+текущей транзакции, поэтому видят записанные в ней данные и не задерживают
+ответ. При ``JOBS_EAGER`` (в тестах) задача выполняется сразу.
+"""
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue(func, *args, **kwargs):
+    """Выполнить ``func(*args, **kwargs)`` в фоне после коммита."""
+    if settings.JOBS_EAGER:
+        _run(func, args, kwargs)
+        return
+    transaction.on_commit(lambda: _submit(func, args, kwargs))
+
+
+def wait():
+    """Дождаться выполнения всех поставленных задач."""
+    _queue.join()
+
+
+def _submit(func, args, kwargs):
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_work, name='jobs-worker', daemon=True)
+            _worker.start()
+    _queue.put((func, args, kwargs))
+
+
+def _work():
+    while True:
+        func, args, kwargs = _queue.get()
+        close_old_connections()
+        try:
+            _run(func, args, kwargs)
+        finally:
+            close_old_connections()
+            _queue.task_done()
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой',
+                         getattr(func, '__qualname__', func))
@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.commands.createcachetable import (
+    Command as CreateCacheTable,
+)
+from django.db import connection, connections
+from django.utils.module_loading import import_string
+
+DB_TABLE = 'cache_benchmark'
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'core.cache_backends.SQLiteCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+
+
+def run_worker(backend, location, number, options, barrier, results):
+    """Смесь чтений, записей и инкрементов общего счётчика в одном
+    процессе; затем проверка, видны ли ключи, записанные соседями."""
+    connections.close_all()
+    cache = import_string(backend)(location, {})
+    rng = random.Random(number)
+    keys = [f'key:{i}' for i in range(options['keys'])]
+    hits = increments = 0
+    started = time.perf_counter()
+    for _ in range(options['operations']):
+        key, roll = rng.choice(keys), rng.random()
+        if roll < options['write_ratio']:
+            cache.set(key, 'x' * options['value_size'])
+        elif roll < options['write_ratio'] * 2:
+            cache.incr('counter')
+            increments += 1
+        else:
+            hits += cache.get(key) is not None
+    elapsed = time.perf_counter() - started
+    cache.set(f'worker:{number}', number)
+    barrier.wait()
+    visible = len(cache.get_many(
+        [f'worker:{i}' for i in range(options['processes'])]))
+    results.put((elapsed, hits, increments, visible))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает бэкенды кэша под нагрузкой из нескольких процессов: '
+            'пропускную способность, долю попаданий, потерю инкрементов '
+            'и видимость записей между процессами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', default=','.join(BACKENDS),
+            help=f'Бэкенды через запятую: {", ".join(BACKENDS)}.')
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument(
+            '--operations', type=int, default=2000,
+            help='Операций на процесс.')
+        parser.add_argument(
+            '--keys', type=int, default=500, help='Размер множества ключей.')
+        parser.add_argument(
+            '--value-size', type=int, default=512, help='Размер значения.')
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.1,
+            help='Доля записей (и такая же доля инкрементов).')
+
+    def handle(self, *args, **options):
+        names = options['backends'].split(',')
+        unknown = set(names) - set(BACKENDS)
+        if unknown:
+            raise CommandError(f'Неизвестные бэкенды: {", ".join(unknown)}')
+        self.stdout.write(
+            f'{"backend":<8} {"ops/s":>10} {"hit %":>6} '
+            f'{"incr seen":>12} {"visible":>8}')
+        with tempfile.TemporaryDirectory() as directory:
+            locations = {
+                'locmem': 'cache-benchmark',
+                'sqlite': os.path.join(directory, 'cache.sqlite3'),
+                'db': DB_TABLE,
+            }
+            for name in names:
+                self.benchmark(name, locations[name], options)
+
+    def benchmark(self, name, location, options):
+        if name == 'db':
+            creator = CreateCacheTable()
+            creator.verbosity = 0
+            creator.create_table(connection.alias, DB_TABLE, dry_run=False)
+        cache = import_string(BACKENDS[name])(location, {})
+        cache.clear()
+        cache.set('counter', 0, None)
+        processes = options['processes']
+        # Воркеры создаются через fork и не должны делить соединения с БД.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        barrier, results = context.Barrier(processes), context.Queue()
+        workers = [
+            context.Process(target=run_worker, args=(
+                BACKENDS[name], location, number, options, barrier, results))
+            for number in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        rows = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = max(row[0] for row in rows)
+        reads = processes * options['operations'] * (
+            1 - 2 * options['write_ratio'])
+        increments = sum(row[2] for row in rows)
+        self.stdout.write(
+            f'{name:<8} '
+            f'{processes * options["operations"] / elapsed:>10.0f} '
+            f'{100 * sum(row[1] for row in rows) / max(reads, 1):>6.1f} '
+            f'{cache.get("counter")!s:>5}/{increments:<6} '
+            f'{min(row[3] for row in rows):>3}/{processes:<4}')
+        if name == 'db':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DROP TABLE {connection.ops.quote_name(DB_TABLE)}')
@@ -0,0 +1,143 @@
+"""Метрики одного запроса: время, запросы к БД, кэш и шаблоны.
+
+Счётчики текущего запроса хранятся в ``threading.local``; обёртки кэша
+и шаблонов, установленные один раз, пишут в них только пока запрос
+измеряется (``RequestMetrics.collect``), и почти ничего не стоят вне его.
+"""
+import functools
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+
+_state = threading.local()
+_NOT_FOUND = object()
+
+
+def current():
+    """Метрики запроса, который сейчас измеряется в этом потоке."""
+    return getattr(_state, 'metrics', None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.wall_time = 0.0
+        self._template_depth = 0
+        self._cache_depth = 0
+
+    @property
+    def db_time(self):
+        return sum(query['time'] for query in self.queries)
+
+    @contextmanager
+    def collect(self):
+        track_cache(caches['default'])
+        _state.metrics = self
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(
+                        functools.partial(self._execute, connection.alias)))
+                yield self
+        finally:
+            self.wall_time = time.perf_counter() - started
+            _state.metrics = None
+
+    def _execute(self, alias, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': alias,
+                'sql': sql,
+                'params': None if many else params,
+                'time': time.perf_counter() - started,
+            })
+
+    def as_dict(self):
+        return {
+            'wall_ms': round(self.wall_time * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2),
+            'queries': len(self.queries),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'template_ms': round(self.template_time * 1000, 2),
+        }
+
+
+def track_cache(backend):
+    """Обернуть ``get``/``get_many`` бэкенда подсчётом попаданий.
+
+    Бэкенды Django создаются по одному на поток, поэтому обёртки ставятся
+    на экземпляр. Вложенные вызовы (``get_many`` через ``get`` и наоборот)
+    считаются один раз.
+    """
+    if getattr(backend, '_metrics_tracked', False):
+        return
+    get, get_many = backend.get, backend.get_many
+
+    @contextmanager
+    def outermost():
+        metrics = current()
+        if metrics is None:
+            yield None
+            return
+        metrics._cache_depth += 1
+        try:
+            yield metrics if metrics._cache_depth == 1 else None
+        finally:
+            metrics._cache_depth -= 1
+
+    def tracked_get(key, default=None, version=None):
+        with outermost() as metrics:
+            value = get(key, _NOT_FOUND, version=version)
+            if metrics is not None:
+                if value is _NOT_FOUND:
+                    metrics.cache_misses += 1
+                else:
+                    metrics.cache_hits += 1
+        return default if value is _NOT_FOUND else value
+
+    def tracked_get_many(keys, version=None):
+        keys = list(keys)
+        with outermost() as metrics:
+            found = get_many(keys, version=version)
+            if metrics is not None:
+                metrics.cache_hits += len(found)
+                metrics.cache_misses += len(keys) - len(found)
+        return found
+
+    backend.get, backend.get_many = tracked_get, tracked_get_many
+    backend._metrics_tracked = True
+
+
+def _timed_render(render):
+    @functools.wraps(render)
+    def wrapper(self, *args, **kwargs):
+        metrics = current()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        # Учитываем только внешний шаблон: вложенные входят в его время.
+        metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.template_time += time.perf_counter() - started
+    wrapper._metrics_timed = True
+    return wrapper
+
+
+if not getattr(Template.render, '_metrics_timed', False):
+    Template.render = _timed_render(Template.render)
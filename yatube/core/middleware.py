@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import cache_tags, metrics
+
+KEY_PREFIX = 'page_cache'
+slow_log = logging.getLogger('core.slow_requests')
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш целых страниц для анонимных GET-запросов.
+
+    Кэшируются только ответы, помеченные ``cache_tags.tag_response``.
+    Запись хранит версии тегов ответа и отбрасывается, как только
+    любая из них изменилась.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return self.get_response(request)
+        key = self.page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            tag_versions, response = entry
+            if cache_tags.versions(tag_versions) == tag_versions:
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        response.get('Last-Modified', '')),
+                    response=response,
+                )
+        response = self.get_response(request)
+        if self.cacheable(response):
+            cache.set(key, (response.surrogate_keys, response),
+                      settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def page_key(self, request):
+        url = request.build_absolute_uri().encode()
+        return f'{KEY_PREFIX}:{hashlib.md5(url).hexdigest()}'
+
+    def cacheable(self, response):
+        return (
+            getattr(response, 'surrogate_keys', None)
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
+
+
+class RequestMetricsMiddleware:
+    """Замеряет каждый запрос и пишет медленные в журнал.
+
+    В ответ добавляется заголовок ``Server-Timing``. Запросы дольше
+    ``SLOW_REQUEST_MS`` или с числом SQL-запросов больше
+    ``SLOW_REQUEST_QUERIES`` пишутся в логгер ``core.slow_requests`` одной
+    строкой JSON вместе с самыми долгими SQL-запросами и их EXPLAIN.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        with request_metrics.collect():
+            response = self.get_response(request)
+        summary = request_metrics.as_dict()
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={summary["wall_ms"]}',
+            f'db;dur={summary["db_ms"]}',
+            f'tpl;dur={summary["template_ms"]}',
+        ])
+        if (summary['wall_ms'] > settings.SLOW_REQUEST_MS
+                or summary['queries'] > settings.SLOW_REQUEST_QUERIES):
+            self.log(request, response, request_metrics, summary)
+        return response
+
+    def log(self, request, response, request_metrics, summary):
+        match = request.resolver_match
+        record = {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            **summary,
+            'sql': [
+                {
+                    'sql': query['sql'],
+                    'ms': round(query['time'] * 1000, 2),
+                    'explain': self.explain(query),
+                }
+                for query in sorted(request_metrics.queries,
+                                    key=lambda query: -query['time'])
+                [:settings.SLOW_REQUEST_EXPLAIN]
+            ],
+        }
+        slow_log.warning(json.dumps(record, ensure_ascii=False, default=str))
+
+    def explain(self, query):
+        if not query['sql'].lstrip().upper().startswith('SELECT'):
+            return None
+        connection = connections[query['alias']]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'{connection.ops.explain_query_prefix()} {query["sql"]}',
+                    query['params'])
+                return [' '.join(map(str, row)) for row in cursor.fetchall()]
+        except DatabaseError as error:
+            return f'EXPLAIN failed: {error}'
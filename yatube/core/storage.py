@@ -0,0 +1,69 @@
+"""Хранилище файлов, адресуемых по содержимому.
+
+Файл сохраняется под именем ``<каталог>/<sha256 содержимого><расширение>``,
+поэтому одинаковые загрузки хранятся один раз, а URL файла никогда не
+меняет содержимое и может кэшироваться навсегда. Удалять файл можно
+только когда на него не осталось ссылок — это решает вызывающий код
+(см. ``delete_unused``).
+"""
+import hashlib
+import os
+import posixpath
+import time
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(
+            posixpath.dirname(name.replace('\\', '/')),
+            digest.hexdigest() + extension)
+        if self.exists(name):
+            try:
+                # Отметка для delete_unused: файл отдан новой загрузке,
+                # ссылка на него может быть ещё не зафиксирована.
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        saved = self._save(name, content)
+        if saved != name:
+            # Тот же файл параллельно записал другой запрос, а
+            # FileSystemStorage сохранил копию под свободным именем.
+            self.delete(saved)
+        return name
+
+    def delete_unused(self, name, in_use, grace):
+        """Удалить файл, если ``in_use()`` ложно и ``save`` не отдавал его
+        новой загрузке последние ``grace`` секунд. Вернуть True, если файл
+        удалён.
+
+        Файл сначала атомарно переносится в сторону: загрузка после этого
+        запишет его заново, а отданный ей раньше файл выдаст свежее время
+        изменения, и файл вернётся на место.
+        """
+        path = self.path(name)
+        aside = f'{path}.{uuid.uuid4().hex}.deleting'
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return False
+        if in_use() or time.time() - os.stat(aside).st_mtime < grace:
+            os.replace(aside, path)
+            return False
+        os.remove(aside)
+        return True
@@ -0,0 +1,22 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page, on_each_side=3):
+    """Номера страниц вокруг текущей, пропуски обозначены ``None``.
+
+    Первая и последняя страницы выводятся всегда, поэтому число ссылок
+    не зависит от размера ленты.
+    """
+    on_each_side = int(on_each_side)
+    num_pages = page.paginator.num_pages
+    first = max(page.number - on_each_side, 1)
+    last = min(page.number + on_each_side, num_pages)
+    window = list(range(first, last + 1))
+    if first > 1:
+        window[:0] = [1] if first == 2 else [1, None]
+    if last < num_pages:
+        window += [num_pages] if last == num_pages - 1 else [None, num_pages]
+    return window
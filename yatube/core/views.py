@@ -1,4 +1,11 @@
+import re
+
 from django.shortcuts import render
+from django.views import static
+
+# Имена файлов ContentAddressedStorage (sha256) и миниатюр sorl (md5):
+# содержимое под таким URL никогда не меняется.
+IMMUTABLE_NAME = re.compile(r'(^|/)[0-9a-f]{32,64}\.\w+$')
 
 
 def page_not_found(request, exception):
@@ -15,3 +22,11 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def media(request, path, document_root=None):
+    """Раздача MEDIA_ROOT с вечным кэшированием неизменяемых файлов."""
+    response = static.serve(request, path, document_root=document_root)
+    if response.status_code == 200 and IMMUTABLE_NAME.search(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -1,27 +1,67 @@
 from django.contrib import admin
 
+from . import search
 from .models import Group, Post, Follow, Comment
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class ScalableAdmin(admin.ModelAdmin):
+    """Список объектов за ограниченное время на больших таблицах.
+
+    Размер таблицы оценивается, а не считается, и полное число строк
+    рядом с отфильтрованным не показывается; связанные объекты
+    подтягиваются join'ом, а при ``full_text_search`` поиск по тексту
+    идёт по полнотекстовому индексу ``posts.search``.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    full_text_search = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not (self.full_text_search and search.enabled()
+                and search.match_query(search_term)):
+            return super().get_search_results(
+                request, queryset, search_term)
+        return queryset.filter(
+            pk__in=search.matching(self.model, search_term)), False
+
+
+@admin.register(Post)
+class PostAdmin(ScalableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    # Группа меняется на странице поста: редактируемое поле в списке
+    # выводило бы в каждой строке все группы или делало бы по запросу
+    # на строку.
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
+    full_text_search = True
+    # Фильтр по дате — диапазон по индексу post_pub_date; date_hierarchy
+    # не используется: он выбирает DISTINCT даты по всей таблице.
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'text', 'author', 'created')
-    search_fields = ('text',)
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
 
 
-class FollowAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'user', 'author')
-    search_fields = ('user',)
+@admin.register(Comment)
+class CommentAdmin(ScalableAdmin):
+    list_display = ('pk', 'text', 'author', 'post', 'created')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post',)
+    search_fields = ('text',)
+    full_text_search = True
+    list_filter = ('created',)
 
 
-admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment, CommentAdmin)
-admin.site.register(Follow, FollowAdmin)
+@admin.register(Follow)
+class FollowAdmin(ScalableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
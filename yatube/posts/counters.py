@@ -0,0 +1,100 @@
+"""Счётчики записей в лентах, хранящиеся в кэше.
+
+Счётчик заполняется одним ``COUNT(*)`` при первом обращении, а затем
+поддерживается инкрементально сигналами сохранения и удаления ``Post``
+(см. ``posts.signals``). Таймаут ограничивает время жизни возможного
+расхождения с базой. Счётчики лент подписок читает только лента на
+подзапросе (``POSTS_FOLLOW_FEED = 'subquery'``), в остальных режимах они
+не ведутся.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow, Post
+
+KEY_PREFIX = 'posts:count'
+
+
+def index_key():
+    return f'{KEY_PREFIX}:index'
+
+
+def group_key(group_id):
+    return f'{KEY_PREFIX}:group:{group_id}'
+
+
+def author_key(author_id):
+    return f'{KEY_PREFIX}:author:{author_id}'
+
+
+def follow_key(user_id):
+    return f'{KEY_PREFIX}:follow:{user_id}'
+
+
+def post_keys(post, group_id=None):
+    """Ключи всех лент, в которые попадает пост, кроме ленты подписок."""
+    keys = [index_key(), author_key(post.author_id)]
+    group_id = post.group_id if group_id is None else group_id
+    if group_id:
+        keys.append(group_key(group_id))
+    return keys
+
+
+def get_count(key, queryset):
+    """Вернуть счётчик ленты, посчитав его по ``queryset`` при промахе."""
+    value = cache.get(key)
+    if value is None:
+        value = queryset.count()
+        cache.add(key, value, settings.POSTS_FEED_COUNT_TIMEOUT)
+    return value
+
+
+def refresh(key, queryset):
+    """Пересчитать счётчик ленты по ``queryset`` и записать в кэш."""
+    value = queryset.count()
+    cache.set(key, value, settings.POSTS_FEED_COUNT_TIMEOUT)
+    return value
+
+
+def adjust(keys, delta):
+    """Изменить счётчики на ``delta`` после фиксации транзакции.
+
+    При откате транзакции кэш не меняется. Отсутствующие в кэше счётчики
+    пропускаются: они будут посчитаны заново при следующем чтении.
+    """
+    keys = list(keys)
+    transaction.on_commit(lambda: _incr(keys, delta))
+
+
+def _incr(keys, delta):
+    for key in keys:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+
+
+def follow_counts_used():
+    return settings.POSTS_FOLLOW_FEED == 'subquery'
+
+
+def adjust_followers(author_id, delta):
+    """Изменить счётчики лент подписок всех подписчиков автора."""
+    if not follow_counts_used():
+        return
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+    adjust(map(follow_key, followers), delta)
+
+
+def adjust_follow_feed(follow, sign):
+    """Перенести посты автора в ленту подписчика или убрать из неё."""
+    key = follow_key(follow.user_id)
+    if not follow_counts_used() or cache.get(key) is None:
+        return
+    author_posts = get_count(
+        author_key(follow.author_id),
+        Post.objects.filter(author_id=follow.author_id),
+    )
+    adjust([key], sign * author_posts)
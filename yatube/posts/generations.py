@@ -0,0 +1,100 @@
+"""Теги кэша страниц и фрагментов posts.
+
+Ключ закэшированного фрагмента ленты включает версию её тега, а кэш
+анонимных страниц (``core.middleware``) проверяет версии всех тегов
+страницы. Сигналы записи постов, комментариев, групп и подписок
+сбрасывают теги затронутых страниц, поэтому таймауты можно держать
+большими.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from core import cache_tags
+
+from .models import Follow, Post
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def author_feed(username):
+    return f'author:{username}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def post_page(post_id):
+    return f'post:{post_id}'
+
+
+def post_feeds(post, group_slugs=(), follower_ids=()):
+    """Теги страниц, на которых показывается пост."""
+    feeds = {
+        index_feed(), post_page(post.pk), author_feed(post.author.username)
+    }
+    feeds.update(map(group_feed, group_slugs))
+    feeds.update(map(follow_feed, follower_ids))
+    return feeds
+
+
+def bump_post(post_id):
+    """Сбросить все страницы, показывающие пост, по его id."""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id).first()
+    if post is not None:
+        slugs = [post.group.slug] if post.group else []
+        followers = Follow.objects.filter(
+            author_id=post.author_id).values_list('user_id', flat=True)
+        bump(post_feeds(post, slugs, followers))
+
+
+def bump_followers(author_id):
+    """Сбросить ленты подписок всех подписчиков автора.
+
+    Подписчиков у автора бывают тысячи, поэтому сигналы постов вызывают
+    это фоновой задачей, а не в запросе.
+    """
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+    bump(map(follow_feed, followers))
+
+
+def post_page_feeds(post_id, username, group_slug=None):
+    """Теги страницы поста: сам пост, автор (счётчик его постов)
+    и группа (её название)."""
+    feeds = [post_page(post_id), author_feed(username)]
+    if group_slug:
+        feeds.append(group_feed(group_slug))
+    return feeds
+
+
+def post_meta_key(post_id):
+    return f'posts:meta:{post_id}'
+
+
+def cached_post_page_feeds(post_id):
+    """Теги страницы поста без обращения к базе в обычном случае.
+
+    Автор и группа поста кэшируются; сигналы сохранения и удаления
+    поста сбрасывают эту запись. Для несуществующего поста — None.
+    """
+    meta = cache.get(post_meta_key(post_id))
+    if meta is None:
+        meta = Post.objects.filter(pk=post_id).values_list(
+            'author__username', 'group__slug').first()
+        if meta is None:
+            return None
+        cache.set(post_meta_key(post_id), meta,
+                  settings.POSTS_FEED_CACHE_TIMEOUT)
+    return post_page_feeds(post_id, *meta)
+
+
+get = cache_tags.version
+bump = cache_tags.purge
@@ -0,0 +1,144 @@
+"""Приём загруженных картинок постов.
+
+Картинка проверяется по заголовку (Pillow читает его лениво, не декодируя
+пиксели), слишком большие по числу пикселей отклоняются до декодирования.
+Затем изображение поворачивается по EXIF, уменьшается до
+``POSTS_IMAGE_MAX_SIZE`` по длинной стороне и перекодируется в WebP,
+если Pillow его поддерживает, иначе в JPEG. Метаданные при этом
+отбрасываются.
+
+Заодно считаются размеры картинки и крошечная размытая заглушка (LQIP,
+несколько сотен байт в data URI), которые сохраняются в посте: шаблоны
+показывают заглушку сразу, не читая файл с диска.
+"""
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP', 'BMP'}
+# Длинная сторона и качество заглушки: 24 пикселя в JPEG — около
+# 350 байт, браузер растягивает её на место картинки.
+PLACEHOLDER_SIZE = 24
+PLACEHOLDER_QUALITY = 40
+# Тег EXIF Orientation и его значения, меняющие местами ширину и высоту.
+ORIENTATION = 0x0112
+ROTATED = {5, 6, 7, 8}
+
+
+class IngestedImage(ContentFile):
+    """Перекодированная картинка вместе с размерами и заглушкой."""
+
+    def __init__(self, content, name, width, height, placeholder):
+        super().__init__(content, name=name)
+        self.width, self.height = width, height
+        self.placeholder = placeholder
+
+
+def output_format():
+    return 'WEBP' if features.check('webp') else 'JPEG'
+
+
+def placeholder(image):
+    """Заглушка декодированной картинки в виде data URI."""
+    small = image.convert('RGB')
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+    output = BytesIO()
+    small.save(output, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    encoded = base64.b64encode(output.getvalue()).decode()
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+def describe(name):
+    """Поля поста для уже сохранённой картинки: размеры и заглушка.
+
+    Нужно для файлов, попавших в пост не через форму (админка, shell).
+    """
+    storage = Post._meta.get_field('image').storage
+    with storage.open(name) as file, Image.open(file) as image:
+        width, height = image.size
+        if image.getexif().get(ORIENTATION) in ROTATED:
+            width, height = height, width
+        image.draft('RGB', (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        return {
+            'image_width': width,
+            'image_height': height,
+            'image_placeholder': placeholder(ImageOps.exif_transpose(image)),
+        }
+
+
+def ingest(uploaded):
+    """Проверить и перекодировать загруженный файл, вернуть новый файл."""
+    uploaded.seek(0)
+    try:
+        image = Image.open(uploaded)
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ValidationError(
+            'Не удалось прочитать изображение.', code='invalid_image'
+        ) from error
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.',
+            code='invalid_format', params={'format': image.format})
+    width, height = image.size
+    if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение слишком большое: %(width)s×%(height)s пикселей.',
+            code='too_many_pixels', params={'width': width, 'height': height})
+
+    max_size = settings.POSTS_IMAGE_MAX_SIZE
+    # Для JPEG декодер сразу уменьшает картинку кратно 1/2–1/8, не
+    # разворачивая в памяти полный размер.
+    image.draft('RGB', (max_size, max_size))
+    try:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+    except OSError as error:
+        raise ValidationError(
+            'Не удалось прочитать изображение.', code='invalid_image'
+        ) from error
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        # В JPEG нет прозрачности: кладём картинку на белый фон.
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGB')
+
+    fmt = output_format()
+    output = BytesIO()
+    # Новый файл пишется без exif и прочих метаданных исходного.
+    image.save(output, fmt, quality=settings.POSTS_IMAGE_QUALITY,
+               optimize=True, **({'progressive': True}
+                                 if fmt == 'JPEG' else {}))
+    stem = os.path.splitext(os.path.basename(uploaded.name))[0]
+    extension = 'webp' if fmt == 'WEBP' else 'jpg'
+    return IngestedImage(output.getvalue(), f'{stem}.{extension}',
+                         image.width, image.height, placeholder(image))
+
+
+def release(name):
+    """Удалить файл картинки и его миниатюры, если на файл больше не
+    ссылается ни один пост: одинаковые загрузки хранятся одним файлом.
+
+    Файл, недавно отданный новой загрузке, остаётся: её пост может быть
+    ещё не зафиксирован (``POSTS_IMAGE_RELEASE_GRACE``).
+    """
+    def in_use():
+        return Post.objects.filter(image=name).exists()
+
+    if not name or in_use():
+        return
+    storage = Post._meta.get_field('image').storage
+    if storage.delete_unused(name, in_use,
+                             settings.POSTS_IMAGE_RELEASE_GRACE):
+        delete_thumbnails(ImageFile(name, storage), delete_file=False)
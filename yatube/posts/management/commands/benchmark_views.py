@@ -0,0 +1,248 @@
+import io
+import json
+import math
+import platform
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import AuthorStats, Group, Post
+
+# Параметры posts.management.commands.seed для каждого размера данных;
+# 'current' — уже заполненная база без пересоздания.
+DATASETS = {
+    'small': {'users': 1000, 'groups': 20, 'posts': 10000,
+              'comments': 20000, 'follows': 5000},
+    'medium': {'users': 10000, 'groups': 100, 'posts': 100000,
+               'comments': 200000, 'follows': 50000},
+    'large': {'users': 50000, 'groups': 500, 'posts': 1000000,
+              'comments': 2000000, 'follows': 500000},
+}
+CURRENT = 'current'
+VIEWS = ('index', 'group_list', 'profile', 'post_detail', 'follow_index',
+         'post_create', 'add_comment')
+# Метрики, рост которых сверх допуска считается регрессией.
+METRICS = ('p95', 'queries', 'peak_kib')
+# Свой кэш в памяти процесса: замер не сбрасывает и не меняет версии
+# тегов, счётчики и ленты в общем кэше работающего сервера.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark_views',
+    }
+}
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def regressions(results, baseline, tolerance):
+    """Строки с метриками, выросшими против ``baseline`` больше чем на
+    ``tolerance``; число запросов должно совпадать точно."""
+    found = []
+    for dataset, views in results.items():
+        for view, metrics in views.items():
+            before = baseline.get(dataset, {}).get(view)
+            if not before:
+                continue
+            for metric in METRICS:
+                allowed = before[metric]
+                if metric != 'queries':
+                    allowed *= 1 + tolerance
+                if metrics[metric] > allowed:
+                    found.append(
+                        f'{dataset}/{view}: {metric} {before[metric]} → '
+                        f'{metrics[metric]}')
+    return found
+
+
+class Command(BaseCommand):
+    help = ('Измеряет страницы posts через тестовый клиент на данных '
+            'разного размера: задержку p50/p95/p99, число запросов и пик '
+            'памяти. Для каждого размера создаётся отдельная тестовая '
+            'база и заполняется командой seed; размер current берёт '
+            'текущую базу, а записи откатываются. Кэш — отдельный, в '
+            'памяти процесса. Результаты пишутся в JSON и сравниваются '
+            'с сохранёнными (--baseline).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='small',
+            help=f'Размеры через запятую: {", ".join(DATASETS)}, '
+                 f'{CURRENT}.')
+        parser.add_argument(
+            '--views', default=','.join(VIEWS),
+            help='Страницы через запятую.')
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Замеров на страницу.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Куда записать JSON.')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого запуска для сравнения.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост задержки и памяти (доля).')
+
+    def handle(self, *args, **options):
+        self.options = options
+        sizes = options['sizes'].split(',')
+        views = options['views'].split(',')
+        unknown = (set(sizes) - set(DATASETS) - {CURRENT}
+                   | set(views) - set(VIEWS))
+        if unknown:
+            raise CommandError(f'Неизвестные значения: {", ".join(unknown)}')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            if baseline['meta']['cold'] != options['cold']:
+                raise CommandError(
+                    'Базовый замер сделан с другим режимом кэша (--cold).')
+        results = {}
+        # Без панели отладки: она добавляет работу к каждому ответу.
+        with override_settings(DEBUG=False, CACHES=BENCHMARK_CACHES):
+            try:
+                for size in sizes:
+                    cache.clear()
+                    results[size] = self.measure_dataset(size, views)
+            finally:
+                cache.clear()
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'requests': options['requests'],
+                'cold': options['cold'],
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if baseline is not None:
+            found = regressions(results, baseline['results'],
+                                options['tolerance'])
+            for line in found:
+                self.stdout.write(self.style.ERROR(line))
+            if found:
+                raise CommandError(f'Регрессий: {len(found)}')
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def measure_dataset(self, size, views):
+        if size == CURRENT:
+            with transaction.atomic():
+                results = self.measure_views(size, views)
+                transaction.set_rollback(True)
+            return results
+        creation = connection.creation
+        old_name = connection.settings_dict['NAME']
+        creation.create_test_db(verbosity=0, autoclobber=True,
+                                serialize=False)
+        try:
+            started = time.perf_counter()
+            call_command('seed', seed=self.options['seed'],
+                         stdout=io.StringIO(), **DATASETS[size])
+            self.stdout.write(
+                f'{size}: данные за {time.perf_counter() - started:.1f} с')
+            return self.measure_views(size, views)
+        finally:
+            creation.destroy_test_db(old_name, verbosity=0)
+
+    def measure_views(self, size, views):
+        requests = self.requests()
+        client = Client()
+        client.force_login(self.follower)
+        self.stdout.write(
+            f'{size:<8} {"view":<13} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8} {"queries":>8} {"peak KiB":>9}')
+        results = {}
+        for view in views:
+            results[view] = metrics = self.measure(client, *requests[view])
+            self.stdout.write(
+                f'{size:<8} {view:<13} {metrics["p50"]:>8.2f} '
+                f'{metrics["p95"]:>8.2f} {metrics["p99"]:>8.2f} '
+                f'{metrics["queries"]:>8} {metrics["peak_kib"]:>9.0f}')
+        return results
+
+    def requests(self):
+        """Запросы к самым тяжёлым объектам: самой большой группе, самому
+        плодовитому автору, самому обсуждаемому посту и пользователю с
+        наибольшим числом подписок."""
+        group = Group.objects.order_by('-posts_count', 'pk').first()
+        post = Post.objects.order_by('-comments_count', 'pk').first()
+        author = AuthorStats.objects.order_by(
+            '-posts_count', 'pk').select_related('user').first()
+        follower = AuthorStats.objects.order_by(
+            '-following_count', 'pk').select_related('user').first()
+        if not (group and post and author and follower):
+            raise CommandError('В базе нет групп, постов или авторов.')
+        self.follower = follower.user
+        return {
+            'index': ('get', reverse('posts:index')),
+            'group_list': ('get', reverse('posts:group_list',
+                                          args=[group.slug])),
+            'profile': ('get', reverse('posts:profile',
+                                       args=[author.user.username])),
+            'post_detail': ('get', reverse('posts:post_detail',
+                                           args=[post.pk])),
+            'follow_index': ('get', reverse('posts:follow_index')),
+            'post_create': ('post', reverse('posts:post_create'),
+                            {'text': 'Замер', 'group': group.pk}),
+            'add_comment': ('post', reverse('posts:add_comment',
+                                            args=[post.pk]),
+                            {'text': 'Замер'}),
+        }
+
+    def request(self, client, method, url, data=None):
+        if self.options['cold']:
+            cache.clear()
+        response = getattr(client, method)(url, data)
+        if response.status_code >= 400:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+
+    def measure(self, client, method, url, data=None):
+        """Прогрев, замеры времени, затем отдельные запросы для подсчёта
+        запросов к базе и пика памяти: их учёт сам замедляет ответ."""
+        for _ in range(self.options['warmup']):
+            self.request(client, method, url, data)
+        timings = []
+        for _ in range(self.options['requests']):
+            started = time.perf_counter()
+            self.request(client, method, url, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        with CaptureQueriesContext(connection) as queries:
+            self.request(client, method, url, data)
+        # Журнал запросов очищается в начале следующего запроса.
+        query_count = len(queries)
+        tracemalloc.start()
+        try:
+            self.request(client, method, url, data)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            'p50': round(percentile(timings, 0.50), 3),
+            'p95': round(percentile(timings, 0.95), 3),
+            'p99': round(percentile(timings, 0.99), 3),
+            'queries': query_count,
+            'peak_kib': round(peak / 1024, 1),
+        }
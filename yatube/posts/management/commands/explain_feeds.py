@@ -0,0 +1,94 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CursorPaginator
+from posts.views import COMMENTS_PER_PAGE, NUMBER_OF_POSTS
+
+# Признаки полного сканирования и сортировки во временной структуре
+# в выводе EXPLAIN разных СУБД.
+FULL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (TABLE )?\w+( AS \w+)?$'),
+    'postgresql': re.compile(r'Seq Scan'),
+    'mysql': re.compile(r'\btype\W+ALL\b'),
+}
+TEMP_SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE'),
+    'postgresql': re.compile(r'\bSort\b'),
+    'mysql': re.compile(r'Using filesort'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов страниц posts, собранных так '
+            'же, как во views, и сообщает '
+            'о полных сканированиях таблиц и сортировках без индекса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Имя пользователя для лент.')
+        parser.add_argument('--group', help='Slug группы.')
+        parser.add_argument('--post', type=int, help='id поста.')
+
+    def handle(self, *args, **options):
+        user = self.sample(User, username=options['user'])
+        group = self.sample(Group, slug=options['group'])
+        post = self.sample(Post, pk=options['post'])
+        problems = 0
+        for name, queryset in self.queries(user, group, post):
+            plan = queryset.explain()
+            issues = self.issues(plan)
+            problems += bool(issues)
+            style = self.style.WARNING if issues else self.style.SUCCESS
+            self.stdout.write(style(f'{name}: {", ".join(issues) or "ok"}'))
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
+        self.stdout.write(f'Запросов с замечаниями: {problems}')
+
+    def sample(self, model, **lookup):
+        lookup = {key: value for key, value in lookup.items() if value}
+        obj = model.objects.filter(**lookup).order_by('pk').first()
+        if obj is None:
+            raise CommandError(
+                f'Нет объекта {model.__name__} для запросов: {lookup or "-"}')
+        return obj
+
+    def queries(self, user, group, post):
+        page = slice(0, NUMBER_OF_POSTS)
+        first = Post.objects.order_by('-pub_date', '-pk').first()
+        cursor = CursorPaginator(Post.objects.all(), NUMBER_OF_POSTS)
+        _, after = cursor.decode_cursor(cursor.encode_cursor(first))
+        subscriptions = Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True)
+        feed = Post.objects.for_feed()
+        yield 'index', feed[page]
+        yield 'index (cursor)', feed.filter(
+            cursor._after(after)).order_by(*cursor._ordering())[page]
+        yield 'group_posts', group.posts.for_feed()[page]
+        yield 'profile', user.posts.for_feed()[page]
+        yield 'profile (following)', Follow.objects.filter(
+            user=user, author=post.author)
+        yield 'post_detail', Post.objects.for_detail().filter(pk=post.pk)
+        yield 'post_detail (comments)', Comment.objects.for_post_page(
+        ).filter(post_id=post.pk).order_by(
+            '-created', '-pk')[:COMMENTS_PER_PAGE]
+        yield 'follow_index (subquery)', feed.filter(
+            author_id__in=subscriptions)[page]
+        yield 'follow_index (timeline)', timeline.feed(
+            user).for_feed()[page]
+        yield 'followers', Follow.objects.filter(author=user).values_list(
+            'user_id', flat=True)
+
+    def issues(self, plan):
+        vendor = connection.vendor
+        issues = []
+        lines = plan.splitlines()
+        if vendor in FULL_SCAN and any(
+                FULL_SCAN[vendor].search(line.strip()) for line in lines):
+            issues.append('полное сканирование')
+        if vendor in TEMP_SORT and any(
+                TEMP_SORT[vendor].search(line) for line in lines):
+            issues.append('сортировка без индекса')
+        return issues
@@ -0,0 +1,35 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в JSON Lines '
+            'потоком, не загружая таблицы в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', '-o', default='-',
+            help='Файл выгрузки (по умолчанию stdout).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['output'] == '-':
+            written = self.write(sys.stdout)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                written = self.write(output)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f'выгружено записей: {written} за {elapsed:.1f} с '
+            f'({written / max(elapsed, 1e-9):.0f} записей/с)')
+
+    def write(self, output):
+        written = 0
+        for line in transfer.export_lines():
+            output.write(line)
+            written += 1
+        return written
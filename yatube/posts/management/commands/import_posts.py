@@ -0,0 +1,58 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку export_posts (JSON Lines) пачками через '
+            'bulk_create, затем пересчитывает счётчики, поисковый индекс '
+            'и ленты подписок. Файлы картинок не копируются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки (по умолчанию stdin).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число записей в одном bulk_create и одной транзакции.')
+        parser.add_argument(
+            '--append', action='store_true',
+            help='Сдвинуть номера постов и комментариев за существующие, '
+                 'а не сохранять номера из выгрузки.')
+
+    def handle(self, *args, **options):
+        importer = transfer.Importer(options['batch_size'], options['append'])
+        started = time.perf_counter()
+        try:
+            if options['path'] == '-':
+                self.load(importer, sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as lines:
+                    self.load(importer, lines)
+            loaded = time.perf_counter() - started
+            importer.finish()
+        except IntegrityError as error:
+            raise CommandError(
+                f'Пачка не сохранена: {error}. Для загрузки рядом с '
+                f'существующими записями используйте --append.')
+        total = time.perf_counter() - started
+        for model, count, seconds in importer.report():
+            self.stdout.write(
+                f'{model}: {count} записей за {seconds:.1f} с '
+                f'({count / max(seconds, 1e-9):.0f} записей/с)')
+        self.stdout.write(
+            f'загрузка {loaded:.1f} с, пересчёт {total - loaded:.1f} с')
+
+    def load(self, importer, lines):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                importer.add(json.loads(line))
+            except (ValueError, KeyError) as error:
+                raise CommandError(f'Строка {number}: {error!r}')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.models import Comment, Post
+
+SOURCES = {
+    'posts': (Post, 'pk', search.post_doc),
+    'comments': (Comment, 'post_id', search.comment_doc),
+}
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает полнотекстовый индекс постов и комментариев, '
+            'читая таблицы пачками; каждая пачка в своей транзакции, '
+            'поиск при этом продолжает работать.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число строк в одной пачке.')
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        for name, (model, post_field, doc) in SOURCES.items():
+            rows = model.objects.order_by('pk').values_list(
+                'pk', 'text', post_field)
+            indexed, last_pk = 0, None
+            while True:
+                batch = rows if last_pk is None else rows.filter(
+                    pk__gt=last_pk)
+                batch = list(batch[:options['batch_size']])
+                if not batch:
+                    break
+                with transaction.atomic():
+                    search.index([(doc(pk), text, post_id)
+                                  for pk, text, post_id in batch])
+                indexed += len(batch)
+                last_pk = batch[-1][0]
+            self.stdout.write(f'{name}: проиндексировано {indexed}')
+        self.stdout.write(f'удалено лишних документов: {search.prune()}')
+        search.optimize()
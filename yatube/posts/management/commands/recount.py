@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.stats import RECOUNTS
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики постов, групп и '
+            'пользователей пачками, каждая пачка в своей транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets', nargs='*',
+            help=f'Что пересчитать: {", ".join(sorted(RECOUNTS))} '
+                 '(по умолчанию всё).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число строк в одной пачке.')
+
+    def handle(self, *args, **options):
+        unknown = set(options['targets']) - set(RECOUNTS)
+        if unknown:
+            raise CommandError(f'Неизвестные счётчики: {", ".join(unknown)}')
+        for target in options['targets'] or sorted(RECOUNTS):
+            model, recount = RECOUNTS[target]
+            pks = model.objects.order_by('pk').values_list('pk', flat=True)
+            updated, last_pk = 0, None
+            while True:
+                batch = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+                batch = list(batch[:options['batch_size']])
+                if not batch:
+                    break
+                with transaction.atomic():
+                    updated += recount(batch)
+                last_pk = batch[-1]
+            self.stdout.write(f'{target}: пересчитано строк {updated}')
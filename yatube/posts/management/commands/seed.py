@@ -0,0 +1,307 @@
+import io
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from posts import images, search, timeline
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.transfer import insert_with_dates
+
+# Столько предложений и слов Faker генерирует один раз; тексты собираются
+# из них случайным выбором, иначе Faker оказывается дольше самой вставки.
+SENTENCES = 5000
+WORDS = 2000
+NAMES = 1000
+
+
+def power_law(count, alpha, rng):
+    """Накопленные веса Ципфа для ``rng.choices``: k-й по популярности
+    объект весит 1 / k ** alpha. Ранги перемешаны, чтобы популярность не
+    совпадала с порядком номеров."""
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return list(itertools.accumulate(rank ** -alpha for rank in ranks))
+
+
+def batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def sample_image(rng, number):
+    """Картинка-заглушка: градиент и несколько фигур."""
+    width, height = rng.choice([(1600, 900), (1200, 1200), (900, 1600)])
+    image = Image.new('RGB', (width, height))
+    draw = ImageDraw.Draw(image)
+    top = [rng.randrange(256) for _ in range(3)]
+    bottom = [rng.randrange(256) for _ in range(3)]
+    for y in range(height):
+        share = y / height
+        draw.line([(0, y), (width, y)], fill=tuple(
+            int(a + (b - a) * share) for a, b in zip(top, bottom)))
+    for _ in range(rng.randint(3, 8)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randint(50, 300)
+        draw.ellipse([x - radius, y - radius, x + radius, y + radius],
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=90)
+    return SimpleUploadedFile(f'seed-{number}.jpg', output.getvalue(),
+                              content_type='image/jpeg')
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу правдоподобными пользователями, группами, '
+            'постами, комментариями и подписками. При одном --seed данные '
+            'одинаковы. Авторы, группы, подписки и комментарии '
+            'распределены по степенному закону (--*-alpha): немного '
+            'популярных и длинный хвост. Строки вставляются bulk_create '
+            'пачками, каждая в своей транзакции; затем пересчитываются '
+            'счётчики, поисковый индекс и ленты подписок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument(
+            '--author-alpha', type=float, default=1.1,
+            help='Крутизна распределения постов по авторам.')
+        parser.add_argument(
+            '--group-alpha', type=float, default=1.0,
+            help='Крутизна распределения постов по группам.')
+        parser.add_argument(
+            '--follow-alpha', type=float, default=1.2,
+            help='Крутизна распределения подписчиков по авторам.')
+        parser.add_argument(
+            '--comment-alpha', type=float, default=0.9,
+            help='Крутизна распределения комментариев по постам.')
+        parser.add_argument(
+            '--group-share', type=float, default=0.6,
+            help='Доля постов, опубликованных в группе.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --until распределены посты.')
+        parser.add_argument(
+            '--until', default='2025-01-01',
+            help='Дата последнего поста (ГГГГ-ММ-ДД).')
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько постов снабдить сгенерированными картинками.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        try:
+            until = datetime.strptime(options['until'], '%Y-%m-%d')
+        except ValueError as error:
+            raise CommandError(error)
+        self.until = until.replace(tzinfo=timezone.utc)
+        self.span = timedelta(days=options['days'])
+        self.make_pools()
+        self.first = {
+            model: (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            for model in (User, Group, Post, Comment)
+        }
+        started = time.perf_counter()
+        self.phase('users', options['users'], self.seed_users)
+        self.phase('groups', options['groups'], self.seed_groups)
+        self.phase('posts', options['posts'], self.seed_posts)
+        self.phase('comments', options['comments'], self.seed_comments)
+        self.phase('follows', options['follows'], self.seed_follows)
+        self.phase('timelines', options['users'], self.seed_timelines)
+        # Номера заданы явно: счётчики последовательностей (PostgreSQL)
+        # нужно передвинуть за них.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [User, Group, Post, Comment]):
+                cursor.execute(sql)
+        counted = time.perf_counter()
+        call_command('recount', batch_size=self.batch_size,
+                     stdout=self.stdout)
+        self.stdout.write(
+            f'счётчики: {time.perf_counter() - counted:.1f} с')
+        # Закэшированные ленты и счётчики не знают о вставленных строках.
+        cache.clear()
+        self.stdout.write(
+            f'всего: {time.perf_counter() - started:.1f} с')
+
+    def phase(self, name, total, seed):
+        started = time.perf_counter()
+        created = seed(total)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{name}: {created} строк за {elapsed:.1f} с '
+            f'({created / max(elapsed, 1e-9):.0f} строк/с)')
+
+    def make_pools(self):
+        fake = Faker('ru_RU')
+        fake.seed_instance(self.options['seed'])
+        self.sentences = [fake.sentence() for _ in range(SENTENCES)]
+        self.words = [fake.word() for _ in range(WORDS)]
+        self.first_names = [fake.first_name() for _ in range(NAMES)]
+        self.last_names = [fake.last_name() for _ in range(NAMES)]
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(
+            self.sentences, k=self.rng.randint(low, high)))
+
+    def pub_date(self, number):
+        """Дата поста: посты равномерно покрывают период по порядку."""
+        share = (number + 1) / max(self.options['posts'], 1)
+        return self.until - self.span * (1 - share)
+
+    def insert(self, model, objects):
+        with transaction.atomic():
+            if model in (Post, Comment):
+                insert_with_dates(model, objects)
+            else:
+                model.objects.bulk_create(objects, ignore_conflicts=(
+                    model is Follow))
+            if model is Post:
+                search.index([(search.post_doc(post.pk), post.text, post.pk)
+                              for post in objects])
+            elif model is Comment:
+                search.index([
+                    (search.comment_doc(comment.pk), comment.text,
+                     comment.post_id) for comment in objects])
+
+    def seed_users(self, total):
+        password = make_password(None)
+        first = self.first[User]
+        for start, size in batches(total, self.batch_size):
+            self.insert(User, [
+                User(pk=first + number, username=f'user{first + number}',
+                     first_name=self.rng.choice(self.first_names),
+                     last_name=self.rng.choice(self.last_names),
+                     password=password)
+                for number in range(start, start + size)])
+        return total
+
+    def seed_groups(self, total):
+        first = self.first[Group]
+        groups = []
+        for number in range(total):
+            title = ' '.join(self.rng.choices(self.words, k=2)).capitalize()
+            groups.append(Group(
+                pk=first + number, title=title[:200],
+                slug=f'g{first + number}', description=self.text(1, 3)))
+        for start, size in batches(total, self.batch_size):
+            self.insert(Group, groups[start:start + size])
+        return total
+
+    def seed_posts(self, total):
+        options = self.options
+        users, groups = options['users'], options['groups']
+        if not users:
+            return 0
+        authors = power_law(users, options['author_alpha'], self.rng)
+        group_weights = power_law(groups, options['group_alpha'], self.rng)
+        pictures = self.seed_images(min(options['images'], total))
+        with_images = set(self.rng.sample(range(total), len(pictures)))
+        pictures = iter(pictures)
+        for start, size in batches(total, self.batch_size):
+            author_ranks = self.rng.choices(
+                range(users), cum_weights=authors, k=size)
+            posts = []
+            for number, author in zip(range(start, start + size),
+                                      author_ranks):
+                group = None
+                if groups and self.rng.random() < options['group_share']:
+                    group = self.first[Group] + self.rng.choices(
+                        range(groups), cum_weights=group_weights)[0]
+                post = Post(
+                    pk=self.first[Post] + number,
+                    author_id=self.first[User] + author,
+                    group_id=group, text=self.text(1, 6),
+                    pub_date=self.pub_date(number))
+                if number in with_images:
+                    fields = next(pictures)
+                    for name, value in fields.items():
+                        setattr(post, name, value)
+                posts.append(post)
+            self.insert(Post, posts)
+        return total
+
+    def seed_images(self, count):
+        """Сохранить ``count`` картинок так же, как при загрузке через
+        форму, и вернуть поля постов для каждой."""
+        storage = Post._meta.get_field('image').storage
+        upload_to = Post._meta.get_field('image').upload_to
+        pictures = []
+        for number in range(count):
+            ingested = images.ingest(sample_image(self.rng, number))
+            name = storage.save(upload_to + ingested.name, ingested)
+            pictures.append({
+                'image': name,
+                'image_width': ingested.width,
+                'image_height': ingested.height,
+                'image_placeholder': ingested.placeholder,
+            })
+        return pictures
+
+    def seed_comments(self, total):
+        posts, users = self.options['posts'], self.options['users']
+        if not posts or not users:
+            return 0
+        weights = power_law(posts, self.options['comment_alpha'], self.rng)
+        for start, size in batches(total, self.batch_size):
+            targets = self.rng.choices(range(posts), cum_weights=weights,
+                                       k=size)
+            self.insert(Comment, [
+                Comment(
+                    pk=self.first[Comment] + number,
+                    post_id=self.first[Post] + target,
+                    author_id=self.first[User] + self.rng.randrange(users),
+                    text=self.text(1, 2),
+                    created=self.pub_date(target) + timedelta(
+                        minutes=self.rng.randrange(60 * 48)))
+                for number, target in zip(range(start, start + size),
+                                          targets)])
+        return total
+
+    def seed_follows(self, total):
+        users = self.options['users']
+        if users < 2:
+            return 0
+        weights = power_law(users, self.options['follow_alpha'], self.rng)
+        before = Follow.objects.count()
+        for start, size in batches(total, self.batch_size):
+            authors = self.rng.choices(range(users), cum_weights=weights,
+                                       k=size)
+            pairs = {(self.rng.randrange(users), author)
+                     for author in authors}
+            self.insert(Follow, [
+                Follow(user_id=self.first[User] + user,
+                       author_id=self.first[User] + author)
+                for user, author in pairs if user != author])
+        # Повторы пар отброшены, поэтому подписок может быть меньше.
+        return Follow.objects.count() - before
+
+    def seed_timelines(self, total):
+        """Собрать ленты подписок новых пользователей тем же запросом, что
+        и при импорте (``timeline.rebuild``)."""
+        if settings.POSTS_FOLLOW_FEED != 'timeline':
+            return 0
+        before = TimelineEntry.objects.count()
+        timeline.rebuild(Follow.objects.filter(
+            user_id__gte=self.first[User]).values_list(
+                'user_id', flat=True).distinct())
+        return TimelineEntry.objects.count() - before
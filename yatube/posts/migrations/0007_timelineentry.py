@@ -0,0 +1,73 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    """Одним INSERT ... SELECT: у каждого автора берутся последние посты,
+    затем у каждого подписчика — последние из постов его авторов.
+
+    Ранжирование то же, что в posts.timeline.rebuild; запрос скопирован,
+    чтобы миграция не зависела от изменений кода.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    post = Post._meta.db_table
+    follow = Follow._meta.db_table
+    entry = TimelineEntry._meta.db_table
+    length = settings.POSTS_TIMELINE_LENGTH
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {entry} (user_id, post_id, pub_date)'
+            f' SELECT user_id, post_id, pub_date FROM ('
+            f'  SELECT f.user_id, r.id AS post_id, r.pub_date,'
+            f'  ROW_NUMBER() OVER ('
+            f'   PARTITION BY f.user_id'
+            f'   ORDER BY r.pub_date DESC, r.id DESC'
+            f'  ) AS position'
+            f'  FROM {follow} f JOIN ('
+            f'   SELECT id, author_id, pub_date FROM ('
+            f'    SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            f'     PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f'    ) AS position FROM {post}'
+            f'   ) latest WHERE position <= %s'
+            f'  ) r ON r.author_id = f.author_id'
+            f' ) ranked WHERE position <= %s',
+            [length, length])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_auto_20221107_1809'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты подписок',
+                'verbose_name_plural': 'Записи ленты подписок',
+                'ordering': ['-pub_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_pub_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique timeline entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Полнотекстовый индекс posts.search существует только в SQLite.
+CREATE = (
+    "CREATE VIRTUAL TABLE posts_search USING fts5("
+    "body, post_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_search (rowid, body, post_id)"
+    " SELECT 2 * id, replace(replace(text, 'ё', 'е'), 'Ё', 'Е'), id"
+    " FROM posts_post",
+    "INSERT INTO posts_search (rowid, body, post_id)"
+    " SELECT 2 * id + 1, replace(replace(text, 'ё', 'е'), 'Ё', 'Е'), post_id"
+    " FROM posts_comment",
+)
+DROP = ('DROP TABLE posts_search',)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -11,6 +13,11 @@ class Group(models.Model):
                             verbose_name='Название в адресной строке'
                             )
     description = models.TextField(verbose_name='Описание группы')
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов',
+    )
 
     class Meta:
         verbose_name = 'Группы'
@@ -20,6 +27,18 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    """Выборки постов со всем, что показывают шаблоны."""
+
+    def for_feed(self):
+        """Карточки лент: автор и группа одним запросом."""
+        return self.select_related('author', 'group')
+
+    def for_detail(self):
+        """Страница поста: ещё и счётчики автора."""
+        return self.select_related('author__stats', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -45,7 +64,44 @@ class Post(models.Model):
         'Картинка',
         upload_to='posts/',
         blank=True,
+        storage=ContentAddressedStorage(),
+    )
+    # Размеры и заглушка картинки считаются при приёме файла
+    # (posts.images), чтобы шаблонам не приходилось открывать файл.
+    image_width = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Ширина картинки',
+    )
+    image_height = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Высота картинки',
+    )
+    image_placeholder = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Заглушка картинки',
     )
+    # Готовые миниатюры картинки по размерам, JSON
+    # {"card": [[имя, ширина, высота], ...]} по возрастанию ширины;
+    # заполняет фоновая задача posts.thumbnails.generate.
+    image_variants = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Миниатюры картинки',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -54,6 +110,21 @@ class Post(models.Model):
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_pub_date'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date'),
+            # Подсчёт ссылок на файл картинки перед его удалением.
+            models.Index(fields=['image'], name='post_image'),
+        ]
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_post_page(self):
+        """Комментарии под постом вместе с авторами."""
+        return self.select_related('author')
 
 
 class Comment(models.Model):
@@ -76,10 +147,19 @@ class Comment(models.Model):
         verbose_name='Дата создания комментария',
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created'),
+            # Список и фильтр по дате в админке.
+            models.Index(fields=['-created', '-id'],
+                         name='comment_created'),
+        ]
 
 
 class Follow(models.Model):
@@ -101,7 +181,73 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        # Поиск подписки (user, author) обслуживает индекс уникальности,
+        # выборку подписчиков автора — обратный составной индекс.
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user'),
+        ]
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique follow')
         ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, обновляемые сигналами posts.signals."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_pub_date'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique timeline entry')
+        ]
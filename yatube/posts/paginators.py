@@ -0,0 +1,229 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+from . import counters
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CountedPaginator(Paginator):
+    """Постраничная разбивка, берущая размер ленты из ``posts.counters``.
+
+    Счётчик может ненадолго расходиться с базой, поэтому срез страницы
+    всегда берётся целиком, а номер страницы за пределами счётчика
+    проверяется ещё раз по пересчитанному ``COUNT(*)``: отставший счётчик
+    не должен подменять существующую страницу первой.
+    """
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.recounted = False
+
+    @cached_property
+    def count(self):
+        return counters.get_count(self.count_key, self.object_list)
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.recounted or int(number) < 1:
+                raise
+        self.recounted = True
+        self.count = counters.refresh(self.count_key, self.object_list)
+        self.__dict__.pop('num_pages', None)
+        return super().validate_number(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Постраничная разбивка для админки без ``COUNT(*)`` по всей таблице.
+
+    Размер нефильтрованной таблицы оценивается: в PostgreSQL по
+    статистике планировщика, в остальных СУБД по наибольшему ``pk``
+    (удалённые строки оценку завышают). Отфильтрованная выборка
+    считается, но не дальше ``limit`` строк.
+    """
+
+    limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimate_rows(queryset)
+        return queryset.order_by()[:self.limit].count()
+
+
+def estimate_rows(queryset):
+    """Примерное число строк в таблице модели выборки."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    return queryset.model._base_manager.using(queryset.db).aggregate(
+        last=Max('pk'))['last'] or 0
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации.
+
+    В отличие от обычной страницы не знает своего номера и общего
+    количества страниц: соседние страницы адресуются непрозрачными
+    токенами ``next_cursor`` и ``previous_cursor``.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page of %s objects>' % len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def start_index(self):
+        return 1 if self.object_list else 0
+
+    def end_index(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """Пагинация по ключу (keyset) вместо OFFSET + COUNT.
+
+    Страница выбирается условием на значения полей ``ordering``
+    относительно последней (или первой) записи соседней страницы, поэтому
+    стоимость запроса не зависит от глубины страницы, а ``COUNT(*)``
+    не выполняется вовсе. Последнее поле ``ordering`` должно быть
+    уникальным (обычно ``pk``), все поля сортируются в одном направлении.
+    """
+
+    cursor_based = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-pk')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.descending = ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in ordering]
+        if any(name.startswith('-') != self.descending for name in ordering):
+            raise ValueError('All cursor fields must share one direction.')
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [
+            self._field(name).value_to_string(obj) for name in self.fields
+        ]
+        payload = json.dumps([int(reverse)] + values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            reverse, *values = json.loads(base64.urlsafe_b64decode(padded))
+            if len(values) != len(self.fields) or None in values:
+                raise ValueError
+            return bool(reverse), [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError,
+                binascii.Error) as error:
+            raise InvalidCursor(cursor) from error
+
+    def page(self, cursor=None):
+        """Вернуть страницу, следующую за курсором (или первую)."""
+        if not cursor:
+            return self._forward_page(self.object_list, has_previous=False)
+        reverse, values = self.decode_cursor(cursor)
+        if reverse:
+            return self._backward_page(values)
+        return self._forward_page(
+            self.object_list.filter(self._after(values)), has_previous=True
+        )
+
+    def get_page(self, cursor=None):
+        """Как ``page``, но на испорченный курсор отдаёт первую страницу."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def _forward_page(self, queryset, has_previous):
+        rows = list(queryset.order_by(*self._ordering())[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return CursorPage(
+            rows, self,
+            next_cursor=self._cursor(rows[-1:], has_next),
+            previous_cursor=self._cursor(rows[:1], has_previous, True),
+        )
+
+    def _backward_page(self, values):
+        queryset = self.object_list.filter(self._after(values, reverse=True))
+        ordering = self._ordering(reverse=True)
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not has_previous:
+            # До начала ленты осталось меньше страницы: отдаём первую
+            # страницу целиком, чтобы она не оказалась неполной.
+            return self._forward_page(self.object_list, has_previous=False)
+        return CursorPage(
+            rows, self,
+            next_cursor=self._cursor(rows[-1:], True),
+            previous_cursor=self._cursor(rows[:1], True, True),
+        )
+
+    def _cursor(self, rows, condition, reverse=False):
+        if not rows or not condition:
+            return None
+        return self.encode_cursor(rows[0], reverse)
+
+    def _ordering(self, reverse=False):
+        prefix = '-' if self.descending != reverse else ''
+        return [prefix + name for name in self.fields]
+
+    def _after(self, values, reverse=False):
+        """Условие «строго после курсора» в лексикографическом порядке.
+
+        Ведущее нестрогое сравнение по первому полю позволяет СУБД
+        обойтись одним диапазоном индекса без сортировки.
+        """
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        condition = Q()
+        for position, name in enumerate(self.fields):
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(self.fields[:position], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return Q(**{f'{self.fields[0]}__{lookup}e': values[0]}) & condition
+
+    def _field(self, name):
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
@@ -0,0 +1,89 @@
+"""Лента подписок, собираемая при чтении (pull model).
+
+Для каждого автора в кэше хранится ограниченный список последних постов
+``(pub_date, pk)``, который сбрасывается при записи постов автора. Страница
+ленты получается k-way слиянием списков подписок через кучу, после чего
+выигравшие посты загружаются одним запросом.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow, Post
+
+KEY_PREFIX = 'posts:recent'
+# Столько авторов в списке IN одного запроса.
+AUTHORS_PER_QUERY = 500
+
+
+def recent_key(author_id):
+    return f'{KEY_PREFIX}:{author_id}'
+
+
+def invalidate(author_id):
+    cache.delete(recent_key(author_id))
+
+
+def load_recent(author_ids):
+    """Последние посты авторов одним запросом на пачку авторов:
+    ROW_NUMBER() отбирает первые посты каждого автора по индексу
+    ``(author, -pub_date)``."""
+    author_ids = list(author_ids)
+    lists = {author_id: [] for author_id in author_ids}
+    sql = (
+        f'SELECT id, author_id, pub_date FROM ('
+        f' SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+        f'  PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+        f' ) AS position FROM {Post._meta.db_table}'
+        f' WHERE author_id IN ({{}})'
+        f') ranked WHERE position <= %s ORDER BY author_id, position'
+    )
+    for start in range(0, len(author_ids), AUTHORS_PER_QUERY):
+        batch = author_ids[start:start + AUTHORS_PER_QUERY]
+        posts = Post.objects.raw(
+            sql.format(', '.join(['%s'] * len(batch))),
+            batch + [settings.POSTS_RECENT_POSTS_LENGTH])
+        for post in posts:
+            lists[post.author_id].append((post.pub_date, post.pk))
+    return lists
+
+
+def recent_posts(author_ids):
+    """Списки последних постов авторов, новые посты первыми."""
+    keys = {recent_key(author_id): author_id for author_id in author_ids}
+    cached = cache.get_many(keys)
+    missing = [author_id for key, author_id in keys.items()
+               if key not in cached]
+    if missing:
+        loaded = {recent_key(author_id): posts
+                  for author_id, posts in load_recent(missing).items()}
+        cache.set_many(loaded, settings.POSTS_RECENT_POSTS_TIMEOUT)
+        cached.update(loaded)
+    return list(cached.values())
+
+
+class MergedFeed:
+    """Лента подписок пользователя для ``Paginator``.
+
+    Курсорную пагинацию не поддерживает: глубина ленты ограничена
+    ``POSTS_RECENT_POSTS_LENGTH`` постами каждого автора.
+    """
+
+    def __init__(self, user):
+        author_ids = Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True)
+        self.lists = recent_posts(author_ids)
+
+    def __len__(self):
+        return sum(map(len, self.lists))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        merged = heapq.merge(*self.lists, reverse=True)
+        ids = [pk for _, pk in islice(
+            merged, index.start, index.stop, index.step)]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
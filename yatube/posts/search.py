@@ -0,0 +1,203 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+Тексты постов и комментариев лежат в одной виртуальной таблице
+``posts_search``: пост под номером ``2 * pk``, комментарий под номером
+``2 * pk + 1``, у обоих в ``post_id`` — пост, к которому ведёт результат.
+Индекс обновляется сигналами ``posts.signals`` в той же транзакции, что
+и сама запись, а команда ``rebuild_search`` перестраивает его целиком.
+
+Результаты — посты, упорядоченные по лучшему совпадению (bm25) среди
+текста поста и его комментариев; совпадение в комментарии весит меньше.
+На других СУБД таблицы нет, и поиск сводится к ``icontains`` по тексту.
+"""
+import base64
+import binascii
+import json
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post
+from .paginators import CursorPage, InvalidCursor
+
+TABLE = 'posts_search'
+# Множитель bm25 для совпадения в комментарии (bm25 тем лучше, чем меньше).
+COMMENT_WEIGHT = 0.5
+# Сколько слов запроса учитывать.
+MAX_TERMS = 8
+# Строк в одном INSERT: по три параметра, не больше 999 переменных,
+# которые допускают старые сборки SQLite.
+ROWS_PER_QUERY = 300
+WORD = re.compile(r'\w+')
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def post_doc(pk):
+    return 2 * pk
+
+
+def comment_doc(pk):
+    return 2 * pk + 1
+
+
+def normalize(text):
+    # unicode61 не отождествляет «ё» и «е».
+    return text.lower().replace('ё', 'е')
+
+
+def match_query(text):
+    """Запрос FTS5: все слова, каждое как префикс; '' если слов нет.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 в пользовательском
+    вводе не действуют.
+    """
+    terms = WORD.findall(normalize(text))[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def index(docs):
+    """Добавить или заменить документы ``(номер, текст, post_id)``."""
+    if not enabled() or not docs:
+        return
+    remove([doc for doc, _, _ in docs])
+    rows = [(doc, normalize(text), post_id) for doc, text, post_id in docs]
+    # Многострочный VALUES вместо executemany: панель SQL debug_toolbar
+    # не умеет показывать executemany и роняет запрос.
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), ROWS_PER_QUERY):
+            batch = rows[start:start + ROWS_PER_QUERY]
+            values = ', '.join(['(%s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, body, post_id) VALUES {values}',
+                [value for row in batch for value in row])
+
+
+def remove(docs):
+    if not enabled() or not docs:
+        return
+    docs = list(docs)
+    with connection.cursor() as cursor:
+        for start in range(0, len(docs), 3 * ROWS_PER_QUERY):
+            batch = docs[start:start + 3 * ROWS_PER_QUERY]
+            marks = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid IN ({marks})', batch)
+
+
+def matching(model, text):
+    """Подзапрос с ``pk`` постов (или комментариев) с совпадением."""
+    return RawSQL(
+        f'SELECT rowid / 2 FROM {TABLE}'
+        f' WHERE {TABLE} MATCH %s AND rowid %% 2 = %s',
+        (match_query(text), 0 if model is Post else 1))
+
+
+def prune():
+    """Убрать из индекса удалённые посты и комментарии, вернуть их число."""
+    removed = 0
+    with connection.cursor() as cursor:
+        for model, parity in ((Post, 0), (Comment, 1)):
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid %% 2 = %s'
+                f' AND rowid / 2 NOT IN (SELECT id FROM'
+                f' {model._meta.db_table})', [parity])
+            removed += cursor.rowcount
+    return removed
+
+
+def optimize():
+    """Слить сегменты индекса FTS5 в один."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+def index_post(post):
+    index([(post_doc(post.pk), post.text, post.pk)])
+
+
+def index_comment(comment):
+    index([(comment_doc(comment.pk), comment.text, comment.post_id)])
+
+
+class SearchPaginator:
+    """Курсорная пагинация результатов поиска по паре (оценка, пост).
+
+    Курсор хранит оценку и номер последнего поста страницы, следующая
+    страница отбирается условием ``HAVING (оценка, пост) > курсор``.
+    Назад результаты не листаются.
+    """
+
+    cursor_based = True
+
+    def __init__(self, text, per_page):
+        self.query = match_query(text)
+        self.text = text
+        self.per_page = int(per_page)
+
+    def encode_cursor(self, score, post_id):
+        payload = json.dumps([score, post_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            score, post_id = json.loads(base64.urlsafe_b64decode(padded))
+            return float(score), int(post_id)
+        except (TypeError, ValueError, binascii.Error) as error:
+            raise InvalidCursor(cursor) from error
+
+    def get_page(self, cursor=None):
+        """Как ``page``, но на испорченный курсор отдаёт первую страницу."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def page(self, cursor=None):
+        after = self.decode_cursor(cursor) if cursor else None
+        if not self.query:
+            return CursorPage([], self)
+        if enabled():
+            rows = self._ranked(after)
+        else:
+            rows = self._fallback(after)
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        posts = Post.objects.for_feed().in_bulk(
+            [post_id for post_id, _ in rows])
+        found = [posts[post_id] for post_id, _ in rows if post_id in posts]
+        next_cursor = None
+        if has_next:
+            post_id, score = rows[-1]
+            next_cursor = self.encode_cursor(score, post_id)
+        return CursorPage(found, self, next_cursor=next_cursor)
+
+    def _ranked(self, after):
+        having, params = '', [COMMENT_WEIGHT, self.query]
+        if after is not None:
+            having = ' HAVING (score, post_id) > (%s, %s)'
+            params += list(after)
+        # Встроенный столбец rank (bm25) доступен и внутри агрегата, в
+        # отличие от вызова bm25().
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id, MIN(rank * CASE rowid %% 2'
+                f' WHEN 1 THEN %s ELSE 1 END) AS score'
+                f' FROM {TABLE} WHERE {TABLE} MATCH %s'
+                f' GROUP BY post_id{having}'
+                f' ORDER BY score, post_id LIMIT %s',
+                params + [self.per_page + 1])
+            return cursor.fetchall()
+
+    def _fallback(self, after):
+        posts = Post.objects.all()
+        for term in WORD.findall(self.text)[:MAX_TERMS]:
+            posts = posts.filter(text__icontains=term)
+        if after is not None:
+            posts = posts.filter(pk__gt=after[1])
+        return [(pk, 0) for pk in posts.order_by('pk').values_list(
+            'pk', flat=True)[:self.per_page + 1]]
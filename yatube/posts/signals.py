@@ -0,0 +1,186 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import jobs
+
+from . import (counters, generations, images, pull_feed, search, stats,
+               timeline)
+from .models import Comment, Follow, Group, Post, User
+
+
+def group_slugs(*group_ids):
+    return list(Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True))
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_group(sender, instance, **kwargs):
+    """Запоминает прежние группу и картинку поста, чтобы перенести
+    счётчик группы и освободить файл заменённой картинки."""
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_image = (
+            sender.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image').first() or (None, None))
+        if instance._previous_image != instance.image.name:
+            # Миниатюры прежней картинки к новой не подходят.
+            instance.image_variants = ''
+
+
+@receiver(pre_save, sender=Post)
+def describe_image(sender, instance, **kwargs):
+    """Переносит в пост размеры и заглушку новой картинки, посчитанные
+    при приёме файла; для прочих файлов их заполнит задача миниатюр."""
+    image = instance.image
+    previous_image = getattr(instance, '_previous_image', image.name)
+    if image and image._committed and previous_image == image.name:
+        return
+    upload = image.file if image and not image._committed else None
+    if isinstance(upload, images.IngestedImage):
+        instance.image_width, instance.image_height = (
+            upload.width, upload.height)
+        instance.image_placeholder = upload.placeholder
+    else:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    pull_feed.invalidate(instance.author_id)
+    cache.delete(generations.post_meta_key(instance.pk))
+    generations.bump(generations.post_feeds(
+        instance, group_slugs(previous_group_id, instance.group_id)))
+    previous_image = getattr(instance, '_previous_image', None)
+    if previous_image and previous_image != instance.image.name:
+        jobs.enqueue(images.release, previous_image)
+    if created:
+        stats.change_author(instance.author_id, 'posts_count', 1)
+        stats.change_group(instance.group_id, 1)
+        counters.adjust(counters.post_keys(instance), 1)
+        counters.adjust_followers(instance.author_id, 1)
+        # Ленты подписчиков сбросит сама задача раскладки.
+        jobs.enqueue(timeline.fan_out, instance.pk)
+        return
+    jobs.enqueue(generations.bump_followers, instance.author_id)
+    if previous_group_id != instance.group_id:
+        stats.change_group(previous_group_id, -1)
+        stats.change_group(instance.group_id, 1)
+        if previous_group_id:
+            counters.adjust([counters.group_key(previous_group_id)], -1)
+        if instance.group_id:
+            counters.adjust([counters.group_key(instance.group_id)], 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    pull_feed.invalidate(instance.author_id)
+    cache.delete(generations.post_meta_key(instance.pk))
+    generations.bump(generations.post_feeds(
+        instance, group_slugs(instance.group_id)))
+    jobs.enqueue(generations.bump_followers, instance.author_id)
+    if instance.image:
+        jobs.enqueue(images.release, instance.image.name)
+    stats.change_author(instance.author_id, 'posts_count', -1)
+    stats.change_group(instance.group_id, -1)
+    counters.adjust(counters.post_keys(instance), -1)
+    counters.adjust_followers(instance.author_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change_author(instance.author_id, 'followers_count', 1)
+        stats.change_author(instance.user_id, 'following_count', 1)
+        counters.adjust_follow_feed(instance, 1)
+        timeline.backfill(instance)
+        bump_follow_feeds(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    stats.change_author(instance.author_id, 'followers_count', -1)
+    stats.change_author(instance.user_id, 'following_count', -1)
+    counters.adjust_follow_feed(instance, -1)
+    timeline.remove(instance)
+    bump_follow_feeds(instance)
+
+
+def bump_follow_feeds(follow):
+    """Лента подписчика и счётчики подписок в профилях обоих."""
+    usernames = User.objects.filter(
+        pk__in=[follow.user_id, follow.author_id]
+    ).values_list('username', flat=True)
+    generations.bump([generations.follow_feed(follow.user_id)]
+                     + [generations.author_feed(name) for name in usernames])
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    # Комментарии удаляются каскадом и убирают себя из индекса сами.
+    search.remove([search.post_doc(instance.pk)])
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove([search.comment_doc(instance.pk)])
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.change_post(instance.post_id, 1)
+        bump_comment_feeds(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.change_post(instance.post_id, -1)
+    bump_comment_feeds(instance)
+
+
+def bump_comment_feeds(comment):
+    """Страница поста и карточки в профиле автора и в группе показывают
+    число комментариев.
+
+    Главная и ленты подписок получат новое число при следующей записи
+    в них или по истечении ``POSTS_FEED_CACHE_TIMEOUT``: сбрасывать их
+    на каждый комментарий слишком дорого.
+    """
+    generations.bump(
+        generations.cached_post_page_feeds(comment.post_id) or [])
+
+
+@receiver(pre_save, sender=Group)
+def remember_previous_slug(sender, instance, **kwargs):
+    """Страницы под старым адресом группы тоже надо сбросить."""
+    if instance.pk is not None:
+        instance._previous_slug = sender.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_feeds(sender, instance, **kwargs):
+    slugs = {instance.slug, getattr(instance, '_previous_slug', None)}
+    generations.bump([generations.index_feed()] + [
+        generations.group_feed(slug) for slug in slugs if slug])
+
+
+@receiver(post_save, sender=User)
+def bump_author_feeds(sender, instance, **kwargs):
+    """Профиль и страницы постов показывают имя автора."""
+    generations.bump([generations.author_feed(instance.username)])
@@ -0,0 +1,69 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются одним ``UPDATE ... SET x = x + 1`` в сигналах
+``posts.signals``, поэтому страницам не нужны ``COUNT``-запросы.
+Расхождения с базой исправляет команда ``recount``.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def change(queryset, field, delta):
+    """Атомарно изменить счётчик, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_author(user_id, field, delta):
+    """Изменить счётчик пользователя, создав строку при первом росте."""
+    queryset = AuthorStats.objects.filter(user_id=user_id)
+    if change(queryset, field, delta) or delta < 0:
+        return
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    change(queryset, field, delta)
+
+
+def change_group(group_id, delta):
+    if group_id:
+        change(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def change_post(post_id, delta):
+    change(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def count_of(model, field):
+    """Выражение с числом строк ``model``, ссылающихся на текущую."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(
+        Subquery(rows.values(field).annotate(n=Count('pk')).values('n')), 0)
+
+
+def recount_posts(pks):
+    return Post.objects.filter(pk__in=pks).update(
+        comments_count=count_of(Comment, 'post'))
+
+
+def recount_groups(pks):
+    return Group.objects.filter(pk__in=pks).update(
+        posts_count=count_of(Post, 'group'))
+
+
+def recount_authors(pks):
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk) for pk in pks), ignore_conflicts=True)
+    return AuthorStats.objects.filter(pk__in=pks).update(
+        posts_count=count_of(Post, 'author'),
+        followers_count=count_of(Follow, 'author'),
+        following_count=count_of(Follow, 'user'),
+    )
+
+
+RECOUNTS = {
+    'posts': (Post, recount_posts),
+    'groups': (Group, recount_groups),
+    'authors': (User, recount_authors),
+}
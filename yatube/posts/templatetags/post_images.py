@@ -0,0 +1,36 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, size):
+    """Готовая миниатюра картинки поста или None, если её ещё строят.
+
+    В отличие от ``{% thumbnail %}`` не строит миниатюру в запросе.
+    """
+    return thumbnails.lookup(image, size)
+
+
+@register.simple_tag
+def post_srcset(image, size):
+    """Значение ``srcset`` из сохранённых миниатюр картинки поста.
+
+    Пустая строка, если вариант один или миниатюры ещё строятся.
+    """
+    if not image:
+        return ''
+    stored = thumbnails.variants(image, size)
+    if len(stored) < 2:
+        return ''
+    return ', '.join(
+        f'{thumbnail.url} {thumbnail.width}w' for thumbnail in stored)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, size):
+    """Найти миниатюры всех постов страницы одним обращением к кэшу."""
+    thumbnails.prefetch(posts, size)
+    return ''
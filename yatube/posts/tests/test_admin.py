@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        start = Post.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(username=f'author{number}')
+            post = Post.objects.create(author=author, group=self.group,
+                                       text=f'Пост номер {number}')
+            Comment.objects.create(post=post, author=author, text='Коммент')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def changelist_queries(self, model, **params):
+        url = reverse(f'admin:posts_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_changelists_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк"""
+        self.create_rows(2)
+        small = {model: len(self.changelist_queries(model))
+                 for model in ('post', 'comment', 'follow')}
+        self.create_rows(8)
+        for model, count in small.items():
+            with self.subTest(model=model):
+                queries = self.changelist_queries(model)
+                self.assertEqual(len(queries), count)
+                self.assertFalse(
+                    [sql for sql in queries if 'COUNT(*)' in sql])
+
+    def test_group_is_not_rendered_as_select(self):
+        """Страница поста не выводит список всех групп"""
+        self.create_rows(1)
+        Group.objects.create(title='Другая группа', slug='other',
+                             description='Описание')
+        for url in (reverse('admin:posts_post_changelist'),
+                    reverse('admin:posts_post_change',
+                            args=[Post.objects.get().pk])):
+            response = self.client.get(url)
+            self.assertContains(response, 'Группа')
+            self.assertNotContains(response, 'Другая группа')
+
+    def test_search_uses_full_text_index(self):
+        """Поиск по тексту идёт по полнотекстовому индексу"""
+        self.create_rows(3)
+        queries = self.changelist_queries('post', q='номер 1')
+        self.assertTrue([sql for sql in queries if 'MATCH' in sql])
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'номер 1'})
+        self.assertContains(response, 'Пост номер 1')
+        self.assertNotContains(response, 'Пост номер 2')
+
+    def test_follow_search_by_username(self):
+        """Подписки ищутся по имени пользователя"""
+        self.create_rows(2)
+        response = self.client.get(reverse('admin:posts_follow_changelist'),
+                                   {'q': 'author1'})
+        self.assertEqual(
+            [follow.author.username
+             for follow in response.context['cl'].result_list],
+            ['author1'])
@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core import cache_tags
+
+from posts import generations
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class BenchmarkViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        post = Post.objects.create(author=author, group=group, text='Пост')
+        Comment.objects.create(post=post, author=reader, text='Коммент')
+        Follow.objects.create(user=reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def benchmark(self, **options):
+        output = os.path.join(self.directory, 'result.json')
+        call_command('benchmark_views', sizes='current', requests=3,
+                     warmup=1, output=output, stdout=StringIO(), **options)
+        with open(output, encoding='utf-8') as file:
+            return json.load(file)
+
+    def test_report_has_metrics_for_every_view(self):
+        """Отчёт содержит метрики всех страниц, записи откатываются"""
+        report = self.benchmark()
+        views = report['results']['current']
+        self.assertEqual(set(views), {
+            'index', 'group_list', 'profile', 'post_detail',
+            'follow_index', 'post_create', 'add_comment'})
+        for view, metrics in views.items():
+            with self.subTest(view=view):
+                self.assertLessEqual(metrics['p50'], metrics['p99'])
+                self.assertGreater(metrics['peak_kib'], 0)
+        self.assertGreater(views['post_create']['queries'], 0)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_regressions_are_reported(self):
+        """Рост числа запросов против базового замера — ошибка"""
+        report = self.benchmark(views='post_detail')
+        report['results']['current']['post_detail']['queries'] -= 1
+        baseline = os.path.join(self.directory, 'baseline.json')
+        with open(baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file)
+        with self.assertRaisesMessage(CommandError, 'Регрессий: 1'):
+            self.benchmark(views='post_detail', baseline=baseline,
+                           tolerance=100)
+
+    def test_shared_cache_is_untouched(self):
+        """Замер работает со своим кэшем и не сбрасывает общий"""
+        cache.set('sentinel', 1)
+        tags = [generations.index_feed(), generations.group_feed('group')]
+        before = cache_tags.versions(tags)
+        self.benchmark(cold=True)
+        self.assertEqual(cache.get('sentinel'), 1)
+        self.assertEqual(cache_tags.versions(tags), before)
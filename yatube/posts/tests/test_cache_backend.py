@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+
+from django.test import SimpleTestCase
+
+from core.cache_backends import SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def test_values_survive_between_instances(self):
+        """Запись видна другому экземпляру бэкенда с тем же файлом"""
+        self.cache.set_many({'a': {'x': 1}, 'b': 2})
+        other = SQLiteCache(self.location, {})
+        self.assertEqual(other.get_many(['a', 'b', 'c']),
+                         {'a': {'x': 1}, 'b': 2})
+
+    def test_add_and_expiry(self):
+        """add не перезаписывает живую запись, но заменяет просроченную"""
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.cache.set('key', 1, timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 3))
+        self.assertEqual(self.cache.get('key'), 3)
+
+    def test_incr_decr(self):
+        """incr и decr меняют число, отсутствие ключа — ValueError"""
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter', 5), 15)
+        self.assertEqual(self.cache.decr('counter'), 14)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_no_new_sqlite_syntax(self):
+        """Запросы не требуют UPSERT и RETURNING (SQLite 3.24+/3.35+)"""
+        statements = []
+        self.cache._db.set_trace_callback(statements.append)
+        self.cache.add('key', 1)
+        self.cache.incr('key')
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.get_many(['key'])
+        self.assertTrue(statements)
+        for statement in statements:
+            self.assertNotIn('ON CONFLICT', statement)
+            self.assertNotIn('RETURNING', statement)
+
+    def test_get_many_within_variable_limit(self):
+        """get_many на тысячах ключей укладывается в 999 переменных"""
+        cache = SQLiteCache(
+            self.location, {'OPTIONS': {'MAX_ENTRIES': 10000}})
+        cache._db.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        data = {f'key{i}': i for i in range(2500)}
+        cache.set_many(data)
+        with cache._db as db:
+            db.execute('UPDATE cache SET accessed = accessed - 10')
+        self.assertEqual(
+            cache.get_many([*data, *(f'missing{i}' for i in range(500))]),
+            data)
+
+    def test_versions(self):
+        """Версии ключей не пересекаются"""
+        self.cache.set('key', 'v1', version=1)
+        self.cache.set('key', 'v2', version=2)
+        self.assertEqual(self.cache.get('key', version=1), 'v1')
+        self.assertEqual(self.cache.get('key', version=2), 'v2')
+        self.cache.delete('key', version=2)
+        self.assertIsNone(self.cache.get('key', version=2))
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи"""
+        cache = SQLiteCache(
+            self.location, {'OPTIONS': {'MAX_ENTRIES': 10}})
+        cache.cull_every = 1
+        cache.set('hot', 1)
+        cache.set_many({f'key{i}': i for i in range(9)})
+        with cache._db as db:
+            db.execute('UPDATE cache SET accessed = accessed - 10')
+        self.assertEqual(cache.get('hot'), 1)
+        cache.set('new', 1)
+        self.assertEqual(cache.get('hot'), 1)
+        self.assertIsNone(cache.get('key0'))
@@ -0,0 +1,81 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExplainFeedsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент и комментариев обслуживаются индексами"""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        report = out.getvalue()
+        for name in ('index', 'index (cursor)', 'group_posts', 'profile',
+                     'post_detail', 'post_detail (comments)',
+                     'follow_index (timeline)'):
+            with self.subTest(name=name):
+                self.assertIn(f'{name}: ok', report)
+
+    def test_queries_match_views(self):
+        """В планах те же соединения с авторами, что и в запросах страниц"""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        index_plan = out.getvalue().split('index (cursor)')[0]
+        self.assertIn('auth_user', index_plan)
+
+
+class RecountCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет расхождения счётчиков"""
+        Post.objects.update(comments_count=7)
+        Group.objects.update(posts_count=0)
+        AuthorStats.objects.all().delete()
+        call_command('recount', '--batch-size=1', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        stats = AuthorStats.objects.get(user=self.user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (1, 1, 0),
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1)
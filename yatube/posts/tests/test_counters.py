@@ -0,0 +1,197 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.templatetags.pagination import page_window
+from posts import counters
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+from posts.views import NUMBER_OF_POSTS
+
+User = get_user_model()
+
+
+@override_settings(POSTS_FOLLOW_FEED='subquery')
+class FeedCountersTest(TransactionTestCase):
+    """Счётчики меняются после фиксации транзакции, поэтому тесты
+    работают без общей транзакции TestCase."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(author=self.author, text='Пост', group=self.group)
+        self.client.force_login(self.reader)
+
+    def feed_counts(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug}))
+        self.client.get(reverse(
+            'posts:profile', kwargs={'username': self.author}))
+        self.client.get(reverse('posts:follow_index'))
+        return [cache.get(key) for key in (
+            counters.index_key(),
+            counters.group_key(self.group.pk),
+            counters.author_key(self.author.pk),
+            counters.follow_key(self.reader.pk),
+        )]
+
+    def test_counters_follow_post_writes(self):
+        """Счётчики лент меняются при создании и удалении поста"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_counts(), [1, 1, 1, 1])
+        post = Post.objects.create(
+            author=self.author, text='Ещё пост', group=self.group)
+        self.assertEqual(self.feed_counts(), [2, 2, 2, 2])
+        post.delete()
+        self.assertEqual(self.feed_counts(), [1, 1, 1, 1])
+
+    def test_rollback_keeps_counters(self):
+        """Пост из откаченной транзакции не меняет счётчики"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.feed_counts()
+        with transaction.atomic():
+            Post.objects.create(
+                author=self.author, text='Откат', group=self.group)
+            transaction.set_rollback(True)
+        self.assertEqual([cache.get(key) for key in (
+            counters.index_key(),
+            counters.group_key(self.group.pk),
+            counters.author_key(self.author.pk),
+            counters.follow_key(self.reader.pk),
+        )], [1, 1, 1, 1])
+
+    def test_counters_follow_subscriptions(self):
+        """Подписка и отписка переносят посты автора в ленту подписок"""
+        self.assertEqual(self.feed_counts()[3], 0)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(cache.get(counters.follow_key(self.reader.pk)), 1)
+        follow.delete()
+        self.assertEqual(cache.get(counters.follow_key(self.reader.pk)), 0)
+
+    def test_group_change_moves_post_between_counters(self):
+        """Смена группы поста переносит его между счётчиками групп"""
+        self.feed_counts()
+        other_key = counters.group_key(self.other_group.pk)
+        cache.set(other_key, 0)
+        post = Post.objects.get()
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(cache.get(counters.group_key(self.group.pk)), 0)
+        self.assertEqual(cache.get(other_key), 1)
+
+    @override_settings(POSTS_FOLLOW_FEED='timeline')
+    def test_follow_counters_only_for_subquery_feed(self):
+        """Без ленты на подзапросе счётчики подписчиков не меняются"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.set(counters.follow_key(self.reader.pk), 5)
+        post = Post.objects.create(author=self.author, text='Ещё пост')
+        post.delete()
+        Follow.objects.get().delete()
+        self.assertEqual(cache.get(counters.follow_key(self.reader.pk)), 5)
+
+    def test_stale_count_serves_requested_page(self):
+        """Отставший счётчик пересчитывается, а не подменяет страницу"""
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Пост') for _ in
+            range(NUMBER_OF_POSTS))
+        cache.set(counters.index_key(), 1)
+        response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertEqual(cache.get(counters.index_key()),
+                         NUMBER_OF_POSTS + 1)
+
+    def test_feed_uses_cached_count(self):
+        """Повторный запрос ленты не выполняет COUNT(*)"""
+        self.client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+
+
+class PageWindowTest(TestCase):
+    def window(self, number, num_pages):
+        page = Paginator(range(num_pages), 1).page(number)
+        return page_window(page, 2)
+
+    def test_page_window(self):
+        """Окно ссылок на страницы не зависит от размера ленты"""
+        self.assertEqual(self.window(1, 3), [1, 2, 3])
+        self.assertEqual(self.window(1, 1000), [1, 2, 3, None, 1000])
+        self.assertEqual(
+            self.window(500, 1000),
+            [1, None, 498, 499, 500, 501, 502, None, 1000],
+        )
+        self.assertEqual(self.window(4, 1000)[:3], [1, 2, 3])
+
+
+class DenormalizedCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев следуют за записями"""
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счётчики подписчиков и подписок"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_profile_does_not_count_posts(self):
+        """Профиль показывает число постов без COUNT-запроса"""
+        Post.objects.create(author=self.author, text='Пост')
+        cache.clear()
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Всего постов: 1')
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
@@ -1,11 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
 from posts.models import Post, Group, Comment
 
@@ -99,7 +101,7 @@ class PostCreateFormTests(TestCase):
         form_data = {
             'text': 'Тестовый пост3',
             'group': PostCreateFormTests.group.id,
-            'image': 'posts/small.gif'
+            'image': PostCreateFormTests.post.image.name
         }
         response = self.authorized_client.post(
             reverse('posts:post_create'),
@@ -124,9 +126,11 @@ class PostCreateFormTests(TestCase):
             data=form_data,
             follow=True
         )
+        comment = Comment.objects.latest('pk')
         self.assertRedirects(
             response, reverse("posts:post_detail",
-                              kwargs={"post_id": PostCreateFormTests.post.id}))
+                              kwargs={"post_id": PostCreateFormTests.post.id})
+            + f'#comment-{comment.pk}')
         self.assertEqual(Comment.objects.count(), comments_count + 1)
 
     def test_post_unathorized_comment(self):
@@ -144,3 +148,70 @@ class PostCreateFormTests(TestCase):
         self.assertRedirects(
             response, '/auth/login/?next=%2Fposts%2F1%2Fcomment%2F')
         self.assertEqual(Comment.objects.count(), comments_count)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_IMAGE_MAX_SIZE=100)
+class ImageIngestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(ImageIngestionTests.user)
+
+    def camera_jpeg(self, size=(400, 200)):
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera model'
+        exif[0x0112] = 6  # Orientation: повернуть на 90° по часовой.
+        output = BytesIO()
+        Image.new('RGB', size, 'red').save(output, 'JPEG', exif=exif)
+        return SimpleUploadedFile('camera.JPG', output.getvalue(),
+                                  content_type='image/jpeg')
+
+    def test_image_is_reencoded(self):
+        """Картинка повёрнута по EXIF, уменьшена и сохранена без EXIF"""
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Пост', 'image': self.camera_jpeg()})
+        post = Post.objects.get(author=self.user)
+        self.assertRegex(post.image.name, r'^posts/[0-9a-f]{64}\.(jpg|webp)$')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, 100))
+            self.assertNotIn('exif', stored.info)
+
+    def test_dimensions_and_placeholder_stored(self):
+        """Размеры и заглушка картинки сохраняются в посте при приёме"""
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Пост', 'image': self.camera_jpeg()})
+        post = Post.objects.get(author=self.user)
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(post.image_placeholder), 1000)
+
+    def test_edit_replaces_dimensions(self):
+        """Замена картинки при редактировании обновляет её размеры"""
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Пост', 'image': self.camera_jpeg()})
+        post = Post.objects.get(author=self.user)
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Пост', 'image': self.camera_jpeg((300, 200))})
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (67, 100))
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=400 * 200 - 1)
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше допустимого числа пикселей отклоняется"""
+        response = self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост', 'image': self.camera_jpeg()})
+        self.assertFormError(
+            response, 'form', 'image',
+            'Изображение слишком большое: 400×200 пикселей.')
+        self.assertFalse(Post.objects.exists())
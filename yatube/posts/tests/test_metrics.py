@@ -0,0 +1,49 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class RequestMetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(RequestMetricsTest.user)
+
+    def test_server_timing_header(self):
+        """Ответ содержит заголовок Server-Timing"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(response['Server-Timing'],
+                         r'^total;dur=[\d.]+, db;dur=[\d.]+, tpl;dur=[\d.]+$')
+
+    @override_settings(SLOW_REQUEST_QUERIES=0)
+    def test_slow_request_log(self):
+        """Медленный запрос пишется в журнал с SQL и EXPLAIN"""
+        with self.assertLogs('core.slow_requests') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        select = next(query for query in record['sql']
+                      if query['sql'].startswith('SELECT'))
+        self.assertTrue(select['explain'])
+
+    def test_fast_request_not_logged(self):
+        """Запрос в пределах порогов в журнал не попадает"""
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('core.slow_requests'):
+                self.client.get(reverse('posts:index'))
@@ -0,0 +1,154 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug})
+        self.other_group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.other_group.slug})
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertIsNone(response.context)
+
+    def assertNotCached(self, url):
+        self.assertIsNotNone(self.client.get(url).context)
+
+    def test_anonymous_pages_are_cached(self):
+        """Повторный анонимный запрос отдаётся из кэша без запросов к БД"""
+        for url in (reverse('posts:index'), self.group_url, self.post_url,
+                    reverse('posts:profile', kwargs={'username': 'author'})):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('Surrogate-Key', response)
+                self.assertCached(url)
+
+    def test_authenticated_pages_are_not_cached(self):
+        """Страницы авторизованных пользователей не кэшируются целиком"""
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.post_url)
+        self.assertIsNotNone(client.get(self.post_url).context)
+
+    def test_comment_purges_only_dependent_pages(self):
+        """Комментарий сбрасывает страницы поста, но не главную и не чужие
+        группы"""
+        index_url = reverse('posts:index')
+        for url in (self.post_url, self.group_url, self.other_group_url,
+                    index_url):
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            Comment.objects.create(
+                post=self.post, author=self.author, text='Комментарий')
+        self.assertFalse(any(
+            Follow._meta.db_table in query['sql'] for query in queries))
+        self.assertNotCached(self.post_url)
+        self.assertNotCached(self.group_url)
+        self.assertCached(self.other_group_url)
+        self.assertCached(index_url)
+
+    def test_follow_purges_profiles(self):
+        """Подписка сбрасывает профиль автора с числом подписчиков"""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.client.get(url)
+        reader = User.objects.create_user(username='reader')
+        self.assertCached(url)
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertNotCached(url)
+
+    def test_post_moved_between_groups_purges_both(self):
+        """Перенос поста сбрасывает страницы старой и новой группы"""
+        self.client.get(self.group_url)
+        self.client.get(self.other_group_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertNotCached(self.group_url)
+        self.assertNotCached(self.other_group_url)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(ConditionalGetTest.author)
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+
+    def revalidate(self, url, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('posts_post', tables)
+        return response
+
+    def test_not_modified_without_feed_query(self):
+        """Совпавший ETag даёт 304 без запросов к постам"""
+        for url in (reverse('posts:index'), self.post_url,
+                    reverse('posts:profile', kwargs={'username': 'author'}),
+                    reverse('posts:follow_index')):
+            with self.subTest(url=url):
+                # Первый ответ выставляет cookie CSRF, от которой зависит ETag.
+                self.client.get(url)
+                etag = self.client.get(url)['ETag']
+                response = self.revalidate(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_last_modified(self):
+        """Страница не изменилась с даты Last-Modified — ответ 304"""
+        self.client.get(self.post_url)
+        last_modified = self.client.get(self.post_url)['Last-Modified']
+        response = self.revalidate(
+            self.post_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_comment_changes_etag(self):
+        """Новый комментарий меняет ETag страницы поста"""
+        etag = self.client.get(self.post_url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        response = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_user(self):
+        """Разные пользователи получают разные ETag"""
+        etag = self.client.get(self.post_url)['ETag']
+        self.client.logout()
+        self.assertNotEqual(self.client.get(self.post_url)['ETag'], etag)
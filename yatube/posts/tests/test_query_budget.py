@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.views import NUMBER_OF_POSTS
+
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+# Запросов на страницу при любом числе постов и комментариев: сессия,
+# пользователь, счётчик ленты, выборка страницы и т.п.
+BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 5,
+    'posts:post_create': 3,
+    'posts:post_edit': 4,
+    'posts:follow_index': 4,
+}
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.author, author=cls.reader)
+        Post.objects.create(author=cls.reader, text='Пост читателя')
+
+    def setUp(self):
+        self.client.force_login(QueryBudgetTest.author)
+        self.urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': 'author'}),
+            'posts:post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}),
+            'posts:post_create': reverse('posts:post_create'),
+            'posts:post_edit': reverse(
+                'posts:post_edit', kwargs={'post_id': self.post.pk}),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def add_content(self):
+        """Полная страница постов разных авторов с комментариями."""
+        for number in range(NUMBER_OF_POSTS * 2):
+            user = User.objects.create_user(
+                username=f'user{number}', first_name=f'Имя {number}')
+            Follow.objects.create(user=self.author, author=user)
+            Post.objects.create(author=user, text=f'Пост {number}',
+                                group=self.group)
+            Comment.objects.create(post=self.post, author=user,
+                                   text=f'Комментарий {number}')
+
+    def count_queries(self, url):
+        cache.clear()
+        with self.assertQueryBudget(len(BUDGETS) * 10) as context:
+            self.client.get(url)
+        return len(context.captured_queries)
+
+    def test_pages_fit_budget(self):
+        """Число запросов страниц не зависит от числа постов"""
+        empty = {name: self.count_queries(url)
+                 for name, url in self.urls.items()}
+        self.add_content()
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                cache.clear()
+                with self.assertQueryBudget(BUDGETS[name]):
+                    self.client.get(url)
+                self.assertEqual(self.count_queries(url), empty[name])
@@ -0,0 +1,108 @@
+from io import StringIO
+
+import debug_toolbar
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+
+from posts import search
+from posts.models import Comment, Post
+from posts.search import SearchPaginator
+
+User = get_user_model()
+# Адреса debug_toolbar подключаются, только если DEBUG включён при загрузке
+# yatube.urls, а тесты запускаются с выключенным.
+urlpatterns = [
+    path('__debug__/', include(debug_toolbar.urls)),
+    path('', include('yatube.urls')),
+]
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def found(self, query, **params):
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': query, **params})
+        return response, [post.pk for post in response.context['page_obj']]
+
+    def test_posts_and_comments_are_ranked(self):
+        """Совпадение в тексте поста выше совпадения в комментарии"""
+        commented = Post.objects.create(author=self.user, text='Про погоду')
+        Comment.objects.create(post=commented, author=self.user,
+                               text='А ёжики тут при чём?')
+        post = Post.objects.create(author=self.user, text='Ежики в лесу')
+        Post.objects.create(author=self.user, text='Ничего общего')
+        response, found = self.found('ЕЖИК')
+        self.assertEqual(found, [post.pk, commented.pk])
+        self.assertContains(response, 'Ежики в лесу')
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении записей"""
+        post = Post.objects.create(author=self.user, text='Старый текст')
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.found('старый')[1], [])
+        self.assertEqual(self.found('новый')[1], [post.pk])
+        comment = Comment.objects.create(post=post, author=self.user,
+                                         text='Комментарий')
+        post.delete()
+        self.assertEqual(self.found('текст')[1], [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.TABLE}'
+                           f' WHERE rowid = %s', [search.comment_doc(
+                               comment.pk)])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_cursor_pagination(self):
+        """Результаты листаются курсором без повторов и пропусков"""
+        posts = [Post.objects.create(author=self.user, text=f'Котик {n}')
+                 for n in range(13)]
+        response, first = self.found('котик')
+        self.assertEqual(len(first), 10)
+        cursor = response.context['page_obj'].next_cursor
+        response, second = self.found('котик', cursor=cursor)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertCountEqual(first + second, [post.pk for post in posts])
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        post = Post.objects.create(author=self.user, text='NEAR OR "AND"')
+        self.assertEqual(self.found('"near OR (and*')[1], [post.pk])
+        self.assertEqual(self.found('  ')[1], [])
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает индекс и удаляет лишние документы"""
+        post = Post.objects.create(author=self.user, text='Снова найдётся')
+        search.index([(search.post_doc(post.pk + 100), 'Призрак', 0)])
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE} WHERE rowid = %s',
+                           [search.post_doc(post.pk)])
+        call_command('rebuild_search', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.found('найдется')[1], [post.pk])
+        self.assertEqual(self.found('призрак')[1], [])
+
+
+@override_settings(DEBUG=True, ROOT_URLCONF=__name__)
+class SearchDebugToolbarTest(TestCase):
+    """Панель SQL debug_toolbar оборачивает курсор при DEBUG и запросах
+    с INTERNAL_IPS; индексация должна с ней работать."""
+
+    def test_writes_with_debug_toolbar(self):
+        user = User.objects.create_user(username='auth')
+        self.client.force_login(user)
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'Под отладкой'},
+                                    REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        response = self.client.post(
+            reverse('posts:add_comment', args=[post.pk]),
+            {'text': 'Комментарий'}, REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(SearchPaginator('отладкой', 10).page(
+            None).object_list[0], post)
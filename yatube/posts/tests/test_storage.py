@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.views import media
+from posts import images
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        image = SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+        return Post.objects.create(author=self.user, text='Пост', image=image)
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые загрузки хранятся одним файлом с именем-хешем"""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{64}\.gif$')
+        self.assertEqual(
+            os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts')),
+            [os.path.basename(first.image.name)])
+
+    @override_settings(POSTS_IMAGE_RELEASE_GRACE=0)
+    def test_file_deleted_with_last_reference(self):
+        """Файл удаляется только вместе с последним ссылающимся постом"""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        name, path = first.image.name, first.image.path
+        first.delete()
+        images.release(name)
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        images.release(name)
+        self.assertFalse(os.path.exists(path))
+
+    def test_reused_file_survives_release(self):
+        """Файл, только что отданный одинаковой загрузке, не удаляется,
+        пока её пост ещё не сохранён"""
+        post = self.create_post('first.gif')
+        name, path = post.image.name, post.image.path
+        os.utime(path, (0, 0))
+        storage = Post._meta.get_field('image').storage
+        upload = SimpleUploadedFile('again.gif', SMALL_GIF)
+        self.assertEqual(storage.save('posts/again.gif', upload), name)
+        post.delete()
+        images.release(name)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(os.listdir(os.path.dirname(path)),
+                         [os.path.basename(path)])
+
+    def test_media_cache_headers(self):
+        """Файлы с именем-хешем отдаются с вечным кэшированием"""
+        post = self.create_post('first.gif')
+        request = RequestFactory().get('/media/' + post.image.name)
+        response = media(request, post.image.name,
+                         document_root=TEMP_MEDIA_ROOT)
+        self.assertEqual(response['Cache-Control'],
+                         'public, max-age=31536000, immutable')
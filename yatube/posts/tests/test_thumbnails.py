@@ -0,0 +1,161 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from posts import generations, thumbnails
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(ThumbnailTest.user)
+
+    def upload(self, name='small.gif'):
+        return SimpleUploadedFile(
+            name=name, content=SMALL_GIF, content_type='image/gif')
+
+    def is_generated(self, post):
+        thumbnail = thumbnails.thumbnail_file(post.image, 'card')
+        return default.kvstore.get(thumbnail) is not None
+
+    def test_form_generates_thumbnails(self):
+        """Миниатюры строятся при сохранении поста с картинкой"""
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Пост', 'image': self.upload()})
+        post = Post.objects.get()
+        self.assertTrue(self.is_generated(post))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, '<img class="card-img my-2"')
+
+    def test_page_does_not_generate_thumbnails(self):
+        """Страница показывает заглушку и не строит миниатюру в запросе"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('other.gif'))
+        with override_settings(JOBS_EAGER=False):
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertFalse(self.is_generated(post))
+
+    def test_generation_purges_cached_feeds(self):
+        """Готовая миниатюра сбрасывает закэшированную с заглушкой ленту"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('feed.gif'))
+        with override_settings(JOBS_EAGER=False):
+            self.client.get(reverse('posts:index'))
+        thumbnails.generate(post.image.name, post.pk)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img my-2"')
+
+    def test_feed_prefetches_thumbnails(self):
+        """Миниатюры страницы ленты читаются одним запросом к хранилищу"""
+        for number in range(3):
+            post = Post.objects.create(author=self.user, text='Пост',
+                                       image=self.upload(f'{number}.gif'))
+            thumbnails.generate(post.image.name, post.pk)
+        # Посты, чьи миниатюры построены до сохранения их списка в посте.
+        Post.objects.update(image_variants='')
+        cache.clear()
+        for expected in (1, 0):
+            generations.bump([generations.index_feed()])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('posts:index'))
+            kvstore_queries = [query for query in queries
+                               if 'thumbnail_kvstore' in query['sql']]
+            self.assertEqual(len(kvstore_queries), expected)
+            self.assertContains(response, '<img class="card-img', count=3)
+
+    def upload_png(self, size):
+        output = BytesIO()
+        Image.new('RGB', size, 'blue').save(output, 'PNG')
+        return SimpleUploadedFile(name='wide.png', content=output.getvalue(),
+                                  content_type='image/png')
+
+    def test_variants_ladder(self):
+        """Строятся только ширины уже исходной картинки"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload_png((500, 300)))
+        thumbnails.generate(post.image.name, post.pk)
+        post.refresh_from_db()
+        widths = [thumbnail.width
+                  for thumbnail in thumbnails.variants(post.image, 'card')]
+        self.assertEqual(widths, [320, 480, 960])
+
+    def test_feed_renders_srcset_without_kvstore(self):
+        """Лента берёт srcset из поста и не обращается к хранилищу sorl"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload_png((1200, 600)))
+        thumbnails.generate(post.image.name, post.pk)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertFalse([query for query in queries
+                          if 'thumbnail_kvstore' in query['sql']])
+        srcset = response.content.decode().split('srcset="')[1].split('"')[0]
+        self.assertEqual([entry.split()[1] for entry in srcset.split(', ')],
+                         ['320w', '480w', '640w', '960w'])
+        self.assertContains(response, 'sizes="(min-width: 1200px)')
+
+    def test_new_image_resets_variants(self):
+        """Замена картинки сбрасывает список миниатюр прежней"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload_png((1200, 600)))
+        thumbnails.generate(post.image.name, post.pk)
+        post.refresh_from_db()
+        post.image = self.upload('new.gif')
+        with override_settings(JOBS_EAGER=False):
+            post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, '')
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_job_describes_image_saved_without_form(self):
+        """Задача миниатюр заполняет размеры и заглушку картинки,
+        загруженной не через форму, и страница показывает заглушку"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload_png((1200, 600)))
+        self.assertIsNone(post.image_width)
+        thumbnails.generate(post.image.name, post.pk)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (1200, 600))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, f'url({post.image_placeholder})')
+        self.assertContains(response, 'loading="lazy"')
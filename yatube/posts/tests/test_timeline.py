@@ -0,0 +1,197 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import generations, pull_feed, timeline
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+@override_settings(POSTS_FOLLOW_FEED='timeline', POSTS_TIMELINE_LENGTH=3)
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.reader = User.objects.create_user(username='reader')
+        for i in range(2):
+            Post.objects.create(author=cls.author, text=f'Пост {i}')
+            Post.objects.create(author=cls.other_author, text=f'Пост {i}')
+
+    def setUp(self):
+        self.client.force_login(TimelineTest.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        """Подписка заполняет ленту, отписка убирает посты автора"""
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(
+            self.feed(), list(Post.objects.filter(author=self.author)))
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.feed()[0], post)
+
+    def test_timeline_length_is_bounded(self):
+        """Длина ленты ограничена POSTS_TIMELINE_LENGTH"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other_author)
+        newest = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(self.feed()[0], newest)
+
+    def test_post_writes_leave_followers_to_jobs(self):
+        """Запись поста не перебирает подписчиков в запросе"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with override_settings(JOBS_EAGER=False), \
+                CaptureQueriesContext(connection) as queries:
+            post = Post.objects.create(author=self.author, text='Пост')
+            post.text = 'Правка'
+            post.save()
+            post.delete()
+        self.assertFalse(any(
+            Follow._meta.db_table in query['sql'] for query in queries))
+
+    def test_edit_and_delete_bump_follow_feeds(self):
+        """Правка и удаление поста сбрасывают ленты подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        feed = generations.follow_feed(self.reader.pk)
+        post = Post.objects.filter(author=self.author).first()
+        for write in (post.save, post.delete):
+            with self.subTest(write=write.__name__):
+                version = generations.get(feed)
+                write()
+                self.assertNotEqual(generations.get(feed), version)
+
+
+@override_settings(POSTS_FOLLOW_FEED='merge', POSTS_RECENT_POSTS_LENGTH=5)
+class MergeFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        for i in range(4):
+            for author in cls.authors:
+                Post.objects.create(author=author, text=f'Пост {i}')
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(MergeFeedTest.reader)
+
+    def test_merged_feed_matches_subscriptions(self):
+        """Слияние списков авторов даёт ленту подписок по дате"""
+        response = self.client.get(reverse('posts:follow_index'))
+        expected = Post.objects.filter(
+            author__in=self.authors[:2]).order_by('-pub_date', '-pk')
+        self.assertEqual(
+            list(response.context['page_obj']), list(expected))
+
+    def test_new_post_invalidates_author_list(self):
+        """Новый пост автора сразу появляется в ленте"""
+        self.client.get(reverse('posts:follow_index'))
+        post = Post.objects.create(author=self.authors[0], text='Новый')
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_page_is_fetched_in_one_query(self):
+        """Посты страницы тёплой ленты загружаются одним запросом"""
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        posts_queries = [
+            query for query in queries
+            if query['sql'].startswith('SELECT')
+            and '"posts_post"' in query['sql'].split('FROM')[1]
+        ]
+        self.assertEqual(len(posts_queries), 1)
+
+    @override_settings(POSTS_RECENT_POSTS_LENGTH=2)
+    def test_cold_author_lists_load_in_one_query(self):
+        """Списки всех авторов без кэша загружаются одним запросом"""
+        author_ids = [author.pk for author in self.authors]
+        with self.assertNumQueries(1):
+            lists = pull_feed.recent_posts(author_ids)
+        expected = [
+            list(Post.objects.filter(author=author).order_by(
+                '-pub_date', '-pk').values_list('pub_date', 'pk')[:2])
+            for author in self.authors
+        ]
+        self.assertCountEqual(lists, expected)
+
+
+@override_settings(POSTS_FOLLOW_FEED='timeline', POSTS_TIMELINE_LENGTH=1000)
+class LargeTimelineTest(TestCase):
+    """Больше 500 строк за раз: столько термов SQLite не примет в одном
+    INSERT, если задать размер пачки bulk_create явно."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+
+    def test_fan_out_to_many_followers(self):
+        """Пост раскладывается в ленты сотен подписчиков"""
+        User.objects.bulk_create(
+            User(username=f'reader{i}') for i in range(600))
+        Follow.objects.bulk_create(
+            Follow(user=user, author=self.author)
+            for user in User.objects.exclude(pk=self.author.pk))
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(
+            TimelineEntry.objects.filter(post=post).count(), 600)
+
+    def test_backfill_many_posts(self):
+        """Подписка на автора с сотнями постов заполняет ленту"""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(600))
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 600)
+
+    def test_rebuild_many_users_and_posts(self):
+        """Ленты многих пользователей собираются заново пачками"""
+        other = User.objects.create_user(username='other')
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(600))
+        Post.objects.bulk_create(
+            Post(author=other, text=f'Пост {i}') for i in range(3))
+        User.objects.bulk_create(
+            User(username=f'reader{i}') for i in range(450))
+        readers = list(User.objects.filter(username__startswith='reader'))
+        Follow.objects.bulk_create(
+            [Follow(user=reader, author=other) for reader in readers]
+            + [Follow(user=readers[0], author=self.author)])
+        timeline.rebuild(reader.pk for reader in readers)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=readers[0]).count(), 603)
+        self.assertEqual(TimelineEntry.objects.count(), 603 + 449 * 3)
+        with self.settings(POSTS_TIMELINE_LENGTH=5):
+            timeline.rebuild([readers[0].pk])
+        expected = Post.objects.filter(
+            author__in=[self.author, other]).order_by(
+                '-pub_date', '-pk').values_list('pk', flat=True)[:5]
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=readers[0]).values_list('post_id', flat=True)),
+            set(expected))
@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from posts.search import SearchPaginator
+
+User = get_user_model()
+PUB_DATE = datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'dump.jsonl')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        for number in range(3):
+            post = Post.objects.create(author=author, group=group,
+                                       text=f'Пост {number}')
+            Comment.objects.create(post=post, author=reader,
+                                   text='Комментарий')
+        Post.objects.update(pub_date=PUB_DATE)
+        Follow.objects.create(user=reader, author=author)
+
+    def export(self):
+        call_command('export_posts', output=self.path, stderr=StringIO())
+        with open(self.path, encoding='utf-8') as lines:
+            return [json.loads(line) for line in lines]
+
+    def load(self, **options):
+        call_command('import_posts', self.path, batch_size=2,
+                     stdout=StringIO(), **options)
+
+    def test_export_lines(self):
+        """Выгрузка пишет записи всех моделей по порядку"""
+        models = [record['model'] for record in self.export()]
+        self.assertEqual(models, ['group'] + ['post'] * 3
+                         + ['comment'] * 3 + ['follow'])
+
+    def test_restore_into_empty_database(self):
+        """Загрузка восстанавливает записи, даты, счётчики, индекс
+        и ленты подписок"""
+        self.export()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.load()
+        author = User.objects.get(username='author')
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author=author).exists())
+        self.assertEqual(set(Post.objects.values_list('pub_date', flat=True)),
+                         {PUB_DATE})
+        self.assertEqual(author.stats.posts_count, 3)
+        self.assertEqual(Group.objects.get().posts_count, 3)
+        self.assertEqual(
+            set(Post.objects.values_list('comments_count', flat=True)), {1})
+        self.assertEqual(TimelineEntry.objects.count(), 3)
+        self.assertEqual(
+            len(SearchPaginator('пост', 10).page().object_list), 3)
+        self.assertFalse(author.has_usable_password())
+
+    def test_import_keeps_auto_now_add_for_other_saves(self):
+        """Пока идёт загрузка, обычные записи получают текущую дату"""
+        self.export()
+        author = User.objects.get(username='author')
+        index = search.index
+        created = []
+
+        def save_during_import(rows):
+            # Нечётные документы — комментарии: к их загрузке номера всех
+            # постов уже заняты.
+            if not created and rows[0][0] % 2:
+                # Индексация нового поста снова вызовет search.index.
+                created.append(None)
+                created[0] = Post.objects.create(author=author, text='Новый')
+            index(rows)
+
+        with mock.patch.object(search, 'index', save_during_import):
+            self.load(append=True)
+        self.assertGreater(Post.objects.get(pk=created[0].pk).pub_date,
+                           PUB_DATE)
+        self.assertEqual(Post.objects.filter(pub_date=PUB_DATE).count(), 6)
+
+    def test_append_shifts_ids(self):
+        """С --append записи загружаются рядом с существующими"""
+        self.export()
+        self.load(append=True)
+        self.assertEqual(Post.objects.count(), 6)
+        self.assertEqual(Comment.objects.count(), 6)
+        self.assertEqual(
+            set(Post.objects.values_list('comments_count', flat=True)), {1})
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+
+
+class UserExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Group.objects.create(title='Чужая', slug='alien',
+                             description='Описание')
+        post = Post.objects.create(author=cls.user, group=cls.group,
+                                   text='Свой пост')
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(post=post, author=cls.other, text='Чужой')
+        Comment.objects.create(post=post, author=cls.user, text='Свой')
+        Follow.objects.create(user=cls.user, author=cls.other)
+        Follow.objects.create(user=cls.other, author=cls.user)
+
+    def download(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:export'))
+            records = [json.loads(line) for line in b''.join(
+                response.streaming_content).decode().splitlines()]
+        return response, records, len(queries)
+
+    def test_anonymous_is_redirected(self):
+        """Выгрузка доступна только авторизованному пользователю"""
+        response = self.client.get(reverse('posts:export'))
+        self.assertRedirects(response, '/auth/login/?next=/export/')
+
+    def test_streams_only_own_data(self):
+        """Выгружаются только свои посты, комментарии и подписки"""
+        self.client.force_login(self.user)
+        response, records, _ = self.download()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'],
+                         'application/x-ndjson; charset=utf-8')
+        self.assertEqual(
+            [(record['model'], record.get('text') or record.get('slug')
+              or record['author']) for record in records],
+            [('group', 'group'), ('post', 'Свой пост'),
+             ('comment', 'Свой'), ('follow', 'other'), ('follow', 'user')])
+
+    def test_queries_do_not_grow_with_account(self):
+        """Число запросов не зависит от размера аккаунта"""
+        self.client.force_login(self.user)
+        *_, before = self.download()
+        for number in range(20):
+            post = Post.objects.create(author=self.user, group=self.group,
+                                       text=f'Пост {number}')
+            Comment.objects.create(post=post, author=self.user, text='Ещё')
+        _, records, after = self.download()
+        self.assertEqual(len(records), 45)
+        self.assertEqual(before, after)
@@ -1,3 +1,5 @@
+import base64
+import json
 import shutil
 import tempfile
 
@@ -8,9 +10,12 @@ from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Post, Group, Follow
-from posts.views import NUMBER_OF_POSTS
+from posts import thumbnails
+from posts.models import Comment, Post, Group, Follow
+from posts.views import COMMENTS_PER_PAGE, NUMBER_OF_POSTS
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -60,6 +65,7 @@ class PostPagesTest(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = self.client
         self.authorized_client.force_login(PostPagesTest.user)
 
@@ -208,6 +214,8 @@ class PostImageTest(TestCase):
             group=cls.group,
             image=cls.uploaded
         )
+        # Как после загрузки через форму: миниатюры уже построены.
+        thumbnails.generate(cls.post.image.name, cls.post.pk)
 
     @classmethod
     def tearDownClass(cls):
@@ -215,6 +223,7 @@ class PostImageTest(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = self.client
         self.authorized_client.force_login(PostImageTest.user)
 
@@ -258,16 +267,25 @@ class PostImageTest(TestCase):
         )
 
     def test_cache(self):
-        """Проверяем, что кэш работает"""
+        """Проверяем, что кэш работает и сбрасывается при записи постов"""
         response_1 = self.client.get(reverse("posts:index")).content
-        Post.objects.all().delete()
+        Post.objects.update(text='Изменено в обход сигналов')
         response_2 = self.client.get(reverse("posts:index")).content
         self.assertEqual(response_1, response_2)
         Post.objects.all().delete()
-        cache.clear()
         response_3 = self.client.get(reverse("posts:index")).content
         self.assertNotEqual(response_1, response_3)
 
+    def test_cache_key_depends_on_page(self):
+        """Разные страницы ленты кэшируются под разными ключами"""
+        for i in range(NUMBER_OF_POSTS):
+            Post.objects.create(author=PostImageTest.user, text=f'Пост {i}')
+        response_1 = self.client.get(reverse("posts:index")).content
+        response_2 = self.client.get(
+            reverse("posts:index") + '?page=2').content
+        self.assertNotEqual(response_1, response_2)
+        self.assertIn(PostImageTest.post.text, response_2.decode())
+
     def test_follow_index_subscribed_users(self):
         """Проверяем, что новая запись пользователя появляется
         в ленте тех, кто на него подписан
@@ -318,3 +336,151 @@ class PostImageTest(TestCase):
         )
         self.assertFalse(Follow.objects.filter(
             author=PostImageTest.user).exists())
+
+
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}', group=cls.group)
+            for i in range(NUMBER_OF_POSTS * 2 + 3)
+        )
+        cls.feeds = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        cursor, pages = '', []
+        while cursor is not None:
+            page_obj = self.client.get(
+                url, {'cursor': cursor}).context['page_obj']
+            pages.append(page_obj)
+            cursor = page_obj.next_cursor
+        return pages
+
+    def test_cursor_pages_cover_feed_in_order(self):
+        """Курсоры проходят всю ленту без пропусков и повторов"""
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True))
+        for url in self.feeds:
+            with self.subTest(url=url):
+                pages = self.walk(url)
+                self.assertEqual(len(pages), 3)
+                self.assertEqual(
+                    [post.pk for page in pages for post in page], expected)
+                self.assertFalse(pages[0].has_previous())
+                self.assertFalse(pages[-1].has_next())
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор previous_cursor возвращает предыдущую страницу"""
+        first, second, _ = self.walk(reverse('posts:index'))
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': second.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(first))
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Испорченный курсор отдаёт первую страницу"""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_cursor_with_bad_values_returns_first_page(self):
+        """Курсор правильного вида с негодными значениями — первая
+        страница"""
+        for values in ([0, 'bad', 1], [0, '2021-01-01', 'bad'],
+                       [1, None, None]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()).decode()
+            self.client.force_login(self.user)
+            for url in self.feeds + (reverse('posts:follow_index'),):
+                with self.subTest(values=values, url=url):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse(
+                        response.context['page_obj'].has_previous())
+
+    def test_cursor_page_does_not_count(self):
+        """Курсорная страница не выполняет COUNT(*)"""
+        second = self.walk(reverse('posts:index'))[1]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:index'), {'cursor': second.next_cursor})
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for i in range(COMMENTS_PER_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(CommentPaginationTest.user)
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.fragment_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk})
+
+    def test_first_page_inline(self):
+        """На странице поста только первая страница новых комментариев"""
+        comments = self.client.get(self.detail_url).context['comments']
+        newest = Comment.objects.filter(post=self.post).order_by(
+            '-created', '-pk')[:COMMENTS_PER_PAGE]
+        self.assertEqual(list(comments), list(newest))
+        self.assertTrue(comments.has_next())
+
+    def test_fragment_returns_next_page(self):
+        """Фрагмент отдаёт следующую страницу без остальной разметки"""
+        first = self.client.get(self.detail_url).context['comments']
+        response = self.client.get(
+            self.fragment_url, {'cursor': first.next_cursor})
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertFalse(rest.has_next())
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, f'id="comment-{rest[0].pk}"')
+
+    def test_page_without_javascript(self):
+        """Ссылка «Показать ещё» работает и без подгрузки фрагмента"""
+        first = self.client.get(self.detail_url).context['comments']
+        response = self.client.get(
+            self.detail_url, {'comments': first.next_cursor})
+        self.assertEqual(len(response.context['comments']), 5)
+
+    def test_bad_cursor_returns_first_page(self):
+        """Курсор комментариев с негодными значениями — первая страница"""
+        cursor = base64.urlsafe_b64encode(
+            json.dumps([0, 'bad', 1]).encode()).decode()
+        for url, name in ((self.detail_url, 'comments'),
+                          (self.fragment_url, 'cursor')):
+            with self.subTest(url=url):
+                response = self.client.get(url, {name: cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['comments']),
+                                 COMMENTS_PER_PAGE)
+
+    def test_fragment_of_missing_post(self):
+        """Фрагмент комментариев несуществующего поста — 404"""
+        response = self.client.get(reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk + 1}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,184 @@
+"""Миниатюры изображений постов.
+
+Миниатюры размеров ``POSTS_THUMBNAILS`` создаются фоновой задачей
+(``core.jobs``) при сохранении картинки, а шаблоны только ищут готовую
+миниатюру в key-value хранилище sorl и никогда не строят её в запросе.
+
+Для размеров из ``POSTS_THUMBNAIL_WIDTHS`` строится лесенка ширин с теми
+же пропорциями; список готовых миниатюр сохраняется в
+``Post.image_variants`` и попадает в ``srcset`` без обращений к хранилищу.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core import jobs
+
+from . import generations, images
+from .models import Post
+
+logger = logging.getLogger(__name__)
+# Сколько секунд не ставить повторно задачу для той же картинки.
+SCHEDULE_TIMEOUT = 60 * 10
+
+
+def thumbnail_file(image, size):
+    """Файл миниатюры, который построил бы для картинки sorl.
+
+    Повторяет вычисление опций и имени из
+    ``ThumbnailBackend.get_thumbnail``, но ничего не читает и не пишет.
+    """
+    geometry, options = settings.POSTS_THUMBNAILS[size]
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def ladder(source, size):
+    """Геометрии миниатюр размера от узкой к широкой.
+
+    Кроме основной геометрии ``POSTS_THUMBNAILS`` — ширины
+    ``POSTS_THUMBNAIL_WIDTHS`` в тех же пропорциях, но только уже
+    исходной картинки: увеличенная копия не меньше и не чётче.
+    """
+    geometry, options = settings.POSTS_THUMBNAILS[size]
+    width, height = map(int, geometry.split('x'))
+    widths = sorted(
+        rung for rung in settings.POSTS_THUMBNAIL_WIDTHS.get(size, ())
+        if rung < min(width, source.width))
+    return [f'{rung}x{round(rung * height / width)}'
+            for rung in widths] + [geometry]
+
+
+def variants(image, size):
+    """Сохранённые в посте миниатюры размера, от узкой к широкой."""
+    post = image.instance
+    stored = getattr(post, '_image_variants', None)
+    if stored is None:
+        stored = post._image_variants = json.loads(
+            post.image_variants or '{}')
+    result = []
+    for name, width, height in stored.get(size, ()):
+        thumbnail = ImageFile(name, default.storage)
+        thumbnail.set_size((width, height))
+        result.append(thumbnail)
+    return result
+
+
+def lookup(image, size):
+    """Готовая миниатюра или None; отсутствующая ставится в очередь."""
+    if not image:
+        return None
+    stored = variants(image, size)
+    if stored:
+        return stored[-1]
+    prefetched = getattr(image.instance, 'thumbnails', {})
+    if size in prefetched:
+        return prefetched[size]
+    thumbnail = default.kvstore.get(thumbnail_file(image, size))
+    if thumbnail is None:
+        schedule(image)
+    return thumbnail
+
+
+def prefetch(posts, size):
+    """Найти миниатюры всех постов страницы одним ``get_many``.
+
+    Результат кладётся в ``post.thumbnails[size]``, откуда его берёт
+    ``lookup``. Не найденные в кэше ключи дочитываются из таблицы
+    хранилища sorl одним запросом. Посты с сохранёнными миниатюрами
+    (``Post.image_variants``) в хранилище не ищутся.
+    """
+    posts = [post for post in posts
+             if post.image and not variants(post.image, size)]
+    files = {post.pk: thumbnail_file(post.image, size) for post in posts}
+    found = get_many_images(file.key for file in files.values())
+    for post in posts:
+        thumbnail = found.get(files[post.pk].key)
+        if thumbnail is None:
+            schedule(post.image)
+        post.thumbnails = {**getattr(post, 'thumbnails', {}), size: thumbnail}
+
+
+def get_many_images(keys):
+    """Пакетный аналог ``kvstore.get``: ключ -> ``ImageFile``."""
+    kvstore = default.kvstore
+    raw_keys = {add_prefix(key): key for key in keys}
+    kv_cache = getattr(kvstore, 'cache', None)
+    if kv_cache is None:
+        # Хранилище без кэша перед таблицей: читаем как sorl, по ключу.
+        found = {key: kvstore._get(key) for key in raw_keys.values()}
+        return {key: value for key, value in found.items() if value}
+    values = kv_cache.get_many(list(raw_keys))
+    missing = raw_keys.keys() - values.keys()
+    if missing:
+        stored = dict(KVStore.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        kv_cache.set_many(
+            {key: stored.get(key, EMPTY_VALUE) for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(stored)
+    return {
+        raw_keys[key]: deserialize_image_file(value)
+        for key, value in values.items() if value and value != EMPTY_VALUE
+    }
+
+
+def schedule(image):
+    """Поставить построение всех миниатюр картинки поста в очередь."""
+    if cache.add(f'posts:thumbnailing:{image.name}', 1, SCHEDULE_TIMEOUT):
+        jobs.enqueue(generate, image.name, image.instance.pk)
+
+
+def generate(name, post_id):
+    """Построить миниатюры, сохранить их список в посте и сбросить
+    закэшированные с заглушкой страницы поста."""
+    # Ключи sorl включают хранилище исходного файла, поэтому файл
+    # открываем через хранилище поля, как это делают шаблоны.
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    try:
+        source = default.kvstore.get_or_set(source)
+    except Exception:
+        logger.warning('Не удалось прочитать картинку %s', name,
+                       exc_info=True)
+        return
+    stored = {}
+    for size, (geometry, options) in settings.POSTS_THUMBNAILS.items():
+        try:
+            built = [get_thumbnail(source, rung, **options)
+                     for rung in ladder(source, size)]
+        except Exception:
+            logger.warning('Не удалось построить миниатюру %s для %s',
+                           size, name, exc_info=True)
+            continue
+        stored[size] = [[thumbnail.name, thumbnail.width, thumbnail.height]
+                        for thumbnail in built]
+    if stored:
+        # Картинку могли заменить, пока строились миниатюры.
+        Post.objects.filter(pk=post_id, image=name).update(
+            image_variants=json.dumps(stored))
+        # Картинка загружена не через форму: размеров и заглушки нет.
+        undescribed = Post.objects.filter(
+            pk=post_id, image=name, image_width__isnull=True)
+        if undescribed.exists():
+            undescribed.update(**images.describe(name))
+        generations.bump_post(post_id)
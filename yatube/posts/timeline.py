@@ -0,0 +1,169 @@
+"""Материализованная лента подписок (fan-out on write).
+
+При публикации пост раскладывается в ленты всех подписчиков автора,
+поэтому ``follow_index`` читает одну ограниченную ленту по индексу
+``(user, -pub_date)`` вместо подзапроса по всем подпискам. Длина ленты
+каждого пользователя ограничена ``POSTS_TIMELINE_LENGTH``.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import QuerySet
+
+from . import generations
+from .models import Follow, Post, TimelineEntry, User
+
+# Столько подписчиков за один bulk_create; размер пачек INSERT внутри
+# него Django выбирает сам с учётом ограничений СУБД.
+BATCH_SIZE = 1000
+# Столько пользователей rebuild пересобирает в одной транзакции и
+# записывает одним INSERT во временную таблицу (меньше 999 параметров).
+REBUILD_USERS = 400
+
+
+def feed(user):
+    """Посты ленты подписок пользователя."""
+    return Post.objects.filter(timeline_entries__user=user).order_by(
+        '-timeline_entries__pub_date')
+
+
+def trim(user_ids):
+    """Оставить в лентах пользователей не больше заданного числа записей.
+
+    ``user_ids`` — список id или выборка id. Граница — дата записи на
+    последнем разрешённом месте — ищется по индексу ``(user, -pub_date)``
+    один раз на пользователя, затем удаляется всё, что старше неё;
+    неполных лент запрос не касается.
+    """
+    if isinstance(user_ids, QuerySet):
+        users, params = user_ids.query.sql_with_params()
+    elif user_ids:
+        params = list(user_ids)
+        users = ', '.join(['%s'] * len(params))
+    else:
+        return
+    entry = TimelineEntry._meta.db_table
+    user = User._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {entry} WHERE id IN ('
+            f' SELECT e.id FROM {entry} e JOIN ('
+            f'  SELECT u.id AS user_id, ('
+            f'   SELECT pub_date FROM {entry}'
+            f'   WHERE user_id = u.id ORDER BY pub_date DESC'
+            f'   LIMIT 1 OFFSET %s'
+            f'  ) AS boundary FROM {user} u WHERE u.id IN ({users})'
+            f' ) b ON e.user_id = b.user_id'
+            f' WHERE e.pub_date < b.boundary)',
+            [settings.POSTS_TIMELINE_LENGTH - 1, *params])
+
+
+def fan_out(post_id):
+    """Разложить новый пост в ленты подписчиков автора.
+
+    Выполняется фоновой задачей: у популярного автора подписчиков тысячи.
+    """
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'pub_date').first()
+    if post is None:
+        return
+    author_id, pub_date = post
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+    user_ids = list(followers)
+    if not user_ids:
+        return
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, post_id=post_id,
+                           pub_date=pub_date)
+             for user_id in user_ids[start:start + BATCH_SIZE]),
+            ignore_conflicts=True,
+        )
+    trim(followers)
+    # Ленты могли закэшироваться между сохранением поста и этой задачей.
+    generations.bump(map(generations.follow_feed, user_ids))
+
+
+def backfill(follow):
+    """Добавить в ленту подписчика последние посты нового автора."""
+    posts = Post.objects.filter(author_id=follow.author_id).values_list(
+        'pk', 'pub_date')[:settings.POSTS_TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=follow.user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        ignore_conflicts=True,
+    )
+    trim([follow.user_id])
+
+
+def remove(follow):
+    """Убрать посты автора из ленты бывшего подписчика."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+def rebuild(user_ids):
+    """Собрать ленты пользователей заново по их текущим подпискам.
+
+    Последние посты каждого автора, на которого подписан кто-то из
+    пользователей, ранжируются один раз во временную таблицу; затем
+    каждая пачка пользователей — один INSERT ... SELECT последних из
+    постов их авторов.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    length = settings.POSTS_TIMELINE_LENGTH
+    post = Post._meta.db_table
+    follow = Follow._meta.db_table
+    entry = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE timeline_rebuild_users'
+            ' (user_id INTEGER PRIMARY KEY)')
+        try:
+            for start in range(0, len(user_ids), REBUILD_USERS):
+                batch = user_ids[start:start + REBUILD_USERS]
+                cursor.execute(
+                    'INSERT INTO timeline_rebuild_users (user_id) VALUES '
+                    + ', '.join(['(%s)'] * len(batch)), batch)
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE timeline_rebuild_posts AS'
+                f' SELECT author_id, id AS post_id, pub_date FROM ('
+                f'  SELECT author_id, id, pub_date, ROW_NUMBER() OVER ('
+                f'   PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                f'  ) AS position FROM {post} WHERE author_id IN ('
+                f'   SELECT f.author_id FROM {follow} f'
+                f'   JOIN timeline_rebuild_users u ON u.user_id = f.user_id)'
+                f' ) ranked WHERE position <= %s', [length])
+            cursor.execute('CREATE INDEX timeline_rebuild_posts_author'
+                           ' ON timeline_rebuild_posts (author_id)')
+            for start in range(0, len(user_ids), REBUILD_USERS):
+                batch = user_ids[start:start + REBUILD_USERS]
+                # Пачка — отрезок отсортированных id, поэтому хватает
+                # двух параметров при любом размере пачки.
+                bounds = [batch[0], batch[-1]]
+                with transaction.atomic():
+                    cursor.execute(
+                        f'DELETE FROM {entry}'
+                        f' WHERE user_id BETWEEN %s AND %s AND user_id IN'
+                        f' (SELECT user_id FROM timeline_rebuild_users)',
+                        bounds)
+                    cursor.execute(
+                        f'INSERT INTO {entry} (user_id, post_id, pub_date)'
+                        f' SELECT user_id, post_id, pub_date FROM ('
+                        f'  SELECT f.user_id, r.post_id, r.pub_date,'
+                        f'  ROW_NUMBER() OVER ('
+                        f'   PARTITION BY f.user_id'
+                        f'   ORDER BY r.pub_date DESC, r.post_id DESC'
+                        f'  ) AS position'
+                        f'  FROM {follow} f JOIN timeline_rebuild_posts r'
+                        f'  ON r.author_id = f.author_id'
+                        f'  WHERE f.user_id BETWEEN %s AND %s AND f.user_id'
+                        f'  IN (SELECT user_id FROM timeline_rebuild_users)'
+                        f' ) ranked WHERE position <= %s',
+                        [*bounds, length])
+        finally:
+            cursor.execute('DROP TABLE IF EXISTS timeline_rebuild_posts')
+            cursor.execute('DROP TABLE timeline_rebuild_users')
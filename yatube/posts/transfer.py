@@ -0,0 +1,308 @@
+"""Перенос постов, комментариев и подписок в формате JSON Lines.
+
+Каждая строка — одна запись ``{"model": ..., ...}``; пользователи и
+группы указываются по ``username`` и ``slug``, посты и комментарии — по
+своим ``id``. Выгрузка идёт потоком через ``iterator(chunk_size)``, так что
+память не зависит от размера базы: сначала группы, затем посты,
+комментарии и подписки.
+
+Загрузка (``Importer``) копит записи пачками и сохраняет каждую пачку
+одним ``bulk_create`` в своей транзакции. ``bulk_create`` не вызывает
+сигналы ``posts.signals``, поэтому после загрузки ``Importer.finish``
+сам пересчитывает счётчики, дополняет поисковый индекс и ленты подписок
+и сбрасывает закэшированные ленты. Файлы картинок не переносятся:
+в записи поста только имя файла.
+"""
+import json
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from . import counters, generations, search, stats, timeline
+from .models import Comment, Follow, Group, Post, User
+
+CHUNK_SIZE = 2000
+# Порядок моделей в выгрузке: записи ссылаются только на предыдущие.
+MODELS = ('group', 'post', 'comment', 'follow')
+
+
+def chunked(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def group_records(groups):
+    for slug, title, description in groups.order_by('pk').values_list(
+            'slug', 'title', 'description').iterator(chunk_size=CHUNK_SIZE):
+        yield {'model': 'group', 'slug': slug, 'title': title,
+               'description': description}
+
+
+def post_records(posts):
+    rows = posts.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+        'image')
+    for pk, author, group, text, pub_date, image in rows.iterator(
+            chunk_size=CHUNK_SIZE):
+        yield {'model': 'post', 'id': pk, 'author': author, 'group': group,
+               'text': text, 'pub_date': pub_date.isoformat(),
+               'image': image}
+
+
+def comment_records(comments):
+    rows = comments.order_by('pk').values_list(
+        'pk', 'post_id', 'author__username', 'text', 'created')
+    for pk, post_id, author, text, created in rows.iterator(
+            chunk_size=CHUNK_SIZE):
+        yield {'model': 'comment', 'id': pk, 'post': post_id,
+               'author': author, 'text': text,
+               'created': created.isoformat()}
+
+
+def follow_records(follows):
+    rows = follows.order_by('pk').values_list(
+        'user__username', 'author__username')
+    for user, author in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield {'model': 'follow', 'user': user, 'author': author}
+
+
+def export_lines(groups=None, posts=None, comments=None, follows=None):
+    """Строки JSON Lines для выборок; ``None`` — вся таблица."""
+    sources = (
+        (group_records, Group, groups),
+        (post_records, Post, posts),
+        (comment_records, Comment, comments),
+        (follow_records, Follow, follows),
+    )
+    for records, model, queryset in sources:
+        if queryset is None:
+            queryset = model.objects.all()
+        for record in records(queryset):
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def byte_chunks(lines, size=64 * 1024):
+    """Склеить строки в куски байтов около ``size`` для отдачи потоком."""
+    buffer, length = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def insert_with_dates(model, objs):
+    """``bulk_create`` для объектов с заданными ``pk``, оставляющий даты
+    как есть.
+
+    Строки вставляются «сырыми», как при ``loaddata``: ``pre_save`` полей
+    не вызывается, поэтому ``auto_now_add`` не подменяет даты из выгрузки
+    текущим временем, а общие для всех потоков поля модели не меняются.
+    """
+    objs = list(objs)
+    fields = model._meta.concrete_fields
+    manager = model._base_manager
+    size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    for batch in chunked(objs, size):
+        manager._insert(batch, fields=fields, raw=True)
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = manager.db
+
+
+class Importer:
+    """Загрузка записей пачками по ``batch_size``.
+
+    Пользователи и группы ищутся по имени через кэши ``users`` и
+    ``groups``; недостающие пользователи создаются без пароля. Номера
+    постов и комментариев сохраняются либо сдвигаются на ``offset``
+    (при ``append``: за последний существующий номер), так что ссылкам
+    комментариев не нужна таблица соответствия.
+    """
+
+    def __init__(self, batch_size=1000, append=False):
+        self.batch_size = batch_size
+        self.users, self.groups = {}, {}
+        self.pending = {model: [] for model in MODELS}
+        self.counts = dict.fromkeys(MODELS, 0)
+        self.seconds = dict.fromkeys(MODELS, 0.0)
+        self.post_offset = self.comment_offset = 0
+        if append:
+            self.post_offset = Post.objects.aggregate(
+                last=Max('pk'))['last'] or 0
+            self.comment_offset = Comment.objects.aggregate(
+                last=Max('pk'))['last'] or 0
+        # Что пересчитать и сбросить после загрузки.
+        self.group_ids, self.author_ids, self.follower_ids = (
+            set(), set(), set())
+        self.post_range = None
+
+    def add(self, record):
+        model = record['model']
+        if model not in self.pending:
+            raise ValueError(f'Неизвестная модель: {model}')
+        # Записи зависят от предыдущих моделей: сохраняем их первыми.
+        for earlier in MODELS[:MODELS.index(model)]:
+            self.flush(earlier)
+        self.pending[model].append(record)
+        if len(self.pending[model]) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model):
+        records = self.pending[model]
+        if not records:
+            return
+        self.pending[model] = []
+        started = time.perf_counter()
+        with transaction.atomic():
+            getattr(self, f'_save_{model}s')(records)
+        self.seconds[model] += time.perf_counter() - started
+        self.counts[model] += len(records)
+
+    def finish(self):
+        """Сохранить остаток и сделать то, что делают сигналы записей."""
+        for model in MODELS:
+            self.flush(model)
+        if self.post_range:
+            low, high = self.post_range
+            pks = Post.objects.filter(pk__range=(low, high)).order_by(
+                'pk').values_list('pk', flat=True)
+            last_pk = None
+            while True:
+                batch = pks if last_pk is None else pks.filter(
+                    pk__gt=last_pk)
+                batch = list(batch[:self.batch_size])
+                if not batch:
+                    break
+                stats.recount_posts(batch)
+                last_pk = batch[-1]
+        for batch in chunked(sorted(self.group_ids), self.batch_size):
+            stats.recount_groups(batch)
+        for batch in chunked(sorted(self.author_ids), self.batch_size):
+            stats.recount_authors(batch)
+            self.follower_ids.update(Follow.objects.filter(
+                author_id__in=batch).values_list('user_id', flat=True))
+        timeline.rebuild(self.follower_ids)
+        # Номера заданы явно: счётчики последовательностей (PostgreSQL)
+        # нужно передвинуть за них.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+        self._purge_feeds()
+
+    def report(self):
+        """Строки ``(модель, записей, секунд)`` для отчёта."""
+        return [(model, self.counts[model], self.seconds[model])
+                for model in MODELS]
+
+    def _user_ids(self, usernames):
+        missing = set(usernames) - self.users.keys()
+        if missing:
+            self.users.update(User.objects.filter(
+                username__in=missing).values_list('username', 'pk'))
+            new = missing - self.users.keys()
+            if new:
+                password = make_password(None)
+                User.objects.bulk_create(
+                    User(username=name, password=password) for name in new)
+                self.users.update(User.objects.filter(
+                    username__in=new).values_list('username', 'pk'))
+        return self.users
+
+    def _group_ids(self, slugs):
+        missing = set(slugs) - self.groups.keys() - {None}
+        if missing:
+            self.groups.update(Group.objects.filter(
+                slug__in=missing).values_list('slug', 'pk'))
+        return self.groups
+
+    def _save_groups(self, records):
+        Group.objects.bulk_create(
+            (Group(slug=record['slug'], title=record['title'],
+                   description=record['description'])
+             for record in records),
+            ignore_conflicts=True)
+        groups = self._group_ids(record['slug'] for record in records)
+        self.group_ids.update(groups[record['slug']] for record in records)
+
+    def _save_posts(self, records):
+        users = self._user_ids(record['author'] for record in records)
+        groups = self._group_ids(record['group'] for record in records)
+        posts = [
+            Post(pk=record['id'] + self.post_offset,
+                 author_id=users[record['author']],
+                 group_id=groups.get(record['group']),
+                 text=record['text'],
+                 pub_date=parse_datetime(record['pub_date']),
+                 image=record.get('image') or '')
+            for record in records
+        ]
+        insert_with_dates(Post, posts)
+        search.index([(search.post_doc(post.pk), post.text, post.pk)
+                      for post in posts])
+        self.author_ids.update(post.author_id for post in posts)
+        self.group_ids.update(post.group_id for post in posts
+                              if post.group_id)
+        self._extend_post_range(post.pk for post in posts)
+
+    def _save_comments(self, records):
+        users = self._user_ids(record['author'] for record in records)
+        comments = [
+            Comment(pk=record['id'] + self.comment_offset,
+                    post_id=record['post'] + self.post_offset,
+                    author_id=users[record['author']],
+                    text=record['text'],
+                    created=parse_datetime(record['created']))
+            for record in records
+        ]
+        insert_with_dates(Comment, comments)
+        search.index([(search.comment_doc(comment.pk), comment.text,
+                       comment.post_id) for comment in comments])
+        self._extend_post_range(comment.post_id for comment in comments)
+
+    def _save_follows(self, records):
+        users = self._user_ids(
+            name for record in records
+            for name in (record['user'], record['author']))
+        follows = [Follow(user_id=users[record['user']],
+                          author_id=users[record['author']])
+                   for record in records]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        for follow in follows:
+            self.author_ids.update((follow.user_id, follow.author_id))
+            self.follower_ids.add(follow.user_id)
+
+    def _extend_post_range(self, pks):
+        pks = list(pks)
+        low, high = min(pks), max(pks)
+        if self.post_range:
+            low = min(low, self.post_range[0])
+            high = max(high, self.post_range[1])
+        self.post_range = (low, high)
+
+    def _purge_feeds(self):
+        feeds = [generations.index_feed()]
+        feeds += map(generations.follow_feed, self.follower_ids)
+        for batch in chunked(self.author_ids, self.batch_size):
+            feeds += map(generations.author_feed, User.objects.filter(
+                pk__in=batch).values_list('username', flat=True))
+        for batch in chunked(self.group_ids, self.batch_size):
+            feeds += map(generations.group_feed, Group.objects.filter(
+                pk__in=batch).values_list('slug', flat=True))
+        generations.bump(feeds)
+        cache.delete_many(
+            [counters.index_key()]
+            + [counters.author_key(pk) for pk in self.author_ids]
+            + [counters.group_key(pk) for pk in self.group_ids]
+            + [counters.follow_key(pk) for pk in self.follower_ids])
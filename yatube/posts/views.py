@@ -1,63 +1,169 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.views.decorators.http import condition
 
-from .models import Group, Post, User, Follow
+from core import cache_tags
+
+from .models import Comment, Group, Post, User, Follow
 from .forms import PostForm, CommentForm
+from . import (counters, generations, pull_feed, thumbnails, timeline,
+               transfer)
+from .paginators import CountedPaginator, CursorPaginator
+from .search import SearchPaginator
 
 NUMBER_OF_POSTS: int = 10
+COMMENTS_PER_PAGE: int = 20
+# Поля, которые сигналы пересчитывают при замене картинки поста.
+IMAGE_DERIVED_FIELDS = ('image_width', 'image_height', 'image_placeholder',
+                        'image_variants')
 
 
-def get_pagination(request, quaryset):
-    paginator = Paginator(quaryset, NUMBER_OF_POSTS)
+def get_pagination(request, quaryset, count_key=None):
+    cursor_requested = (settings.POSTS_CURSOR_PAGINATION
+                        or 'cursor' in request.GET)
+    if cursor_requested and isinstance(quaryset, QuerySet):
+        paginator = CursorPaginator(quaryset, NUMBER_OF_POSTS)
+        return paginator.get_page(request.GET.get('cursor'))
+    if count_key is None:
+        paginator = Paginator(quaryset, NUMBER_OF_POSTS)
+    else:
+        paginator = CountedPaginator(quaryset, NUMBER_OF_POSTS, count_key)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
+def get_comments_page(post_id, cursor=None):
+    """Страница комментариев поста, новые сверху, вместе с авторами."""
+    paginator = CursorPaginator(
+        Comment.objects.for_post_page().filter(post_id=post_id),
+        COMMENTS_PER_PAGE, ordering=('-created', '-pk'))
+    return paginator.get_page(cursor)
+
+
+def feed_context(page_obj, feed):
+    """Контекст ленты с версией для ключа кэша фрагмента."""
+    return {
+        'page_obj': page_obj,
+        'feed_version': generations.get(feed),
+        'feed_cache_timeout': settings.POSTS_FEED_CACHE_TIMEOUT,
+    }
+
+
+def conditional(page_feeds):
+    """Условный GET: ETag и Last-Modified по тегам страницы.
+
+    Теги берутся из URL (и кэша), поэтому ответ 304 отдаётся без запроса
+    ленты и отрисовки шаблона. ETag учитывает пользователя и секрет
+    CSRF: от них зависят шапка страницы и формы.
+    """
+    def etag(request, *args, **kwargs):
+        feeds = page_feeds(request, *args, **kwargs)
+        if feeds is None:
+            return None
+        return cache_tags.etag(feeds, request.user.pk,
+                               request.META.get('CSRF_COOKIE'))
+
+    def last_modified(request, *args, **kwargs):
+        feeds = page_feeds(request, *args, **kwargs)
+        if feeds is None:
+            return None
+        return cache_tags.last_modified(feeds)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+@conditional(lambda request: [generations.index_feed()])
 def index(request):
     page_obj = get_pagination(request,
-                              Post.objects.select_related('group').all())
-    return render(request, 'posts/index.html', {'page_obj': page_obj})
+                              Post.objects.for_feed(),
+                              counters.index_key())
+    feed = generations.index_feed()
+    context = feed_context(page_obj, feed)
+    response = render(request, 'posts/index.html', context)
+    return cache_tags.tag_response(response, {feed: context['feed_version']})
 
 
+@conditional(lambda request, slug: [generations.group_feed(slug)])
 def group_posts(request, slug):
     some_group = get_object_or_404(Group, slug=slug)
-    posts = some_group.posts.all()
-    page_obj = get_pagination(request, posts)
-    context = {
-        'page_obj': page_obj,
-        'group': some_group,
-    }
-    return render(request, 'posts/group_list.html', context)
+    posts = some_group.posts.for_feed()
+    page_obj = get_pagination(request, posts,
+                              counters.group_key(some_group.pk))
+    feed = generations.group_feed(some_group.slug)
+    context = feed_context(page_obj, feed)
+    context['group'] = some_group
+    response = render(request, 'posts/group_list.html', context)
+    return cache_tags.tag_response(response, {feed: context['feed_version']})
 
 
+@conditional(lambda request, username: [generations.author_feed(username)])
 def profile(request, username):
-    requested_author = get_object_or_404(User, username=username)
-    posts = requested_author.posts.all()
-    page_obj = get_pagination(request, posts)
-    context = {
-        'page_obj': page_obj,
-        'author': requested_author,
-    }
+    requested_author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    posts = requested_author.posts.for_feed()
+    page_obj = get_pagination(request, posts,
+                              counters.author_key(requested_author.pk))
+    feed = generations.author_feed(requested_author.username)
+    context = feed_context(page_obj, feed)
+    context['author'] = requested_author
     if request.user.is_authenticated:
         quaryset = Follow.objects.filter(
             user=request.user,
             author=requested_author,
         )
         context['following'] = quaryset.exists()
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    return cache_tags.tag_response(response, {feed: context['feed_version']})
 
 
+@conditional(
+    lambda request, post_id: generations.cached_post_page_feeds(post_id))
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.for_detail(), pk=post_id)
+    # Версии читаются до выборки комментариев, чтобы запись, пришедшая
+    # во время отрисовки, не оставила в кэше устаревшую страницу.
+    tag_versions = cache_tags.versions(generations.post_page_feeds(
+        post.pk, post.author.username, post.group and post.group.slug))
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = get_comments_page(post.pk, request.GET.get('comments'))
     context = {
         'post': post,
         'form': form,
         'comments': comments
     }
-    return render(request, 'posts/post_detail.html', context)
+    response = render(request, 'posts/post_detail.html', context)
+    return cache_tags.tag_response(response, tag_versions)
+
+
+@conditional(lambda request, post_id: [generations.post_page(post_id)])
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев для подгрузки."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    tag_versions = cache_tags.versions([generations.post_page(post_id)])
+    context = {
+        'post_id': post_id,
+        'comments': get_comments_page(post_id, request.GET.get('cursor')),
+    }
+    response = render(request, 'posts/includes/comments.html', context)
+    return cache_tags.tag_response(response, tag_versions)
+
+
+def search(request):
+    """Поиск по постам и комментариям, лучшие совпадения первыми."""
+    query = request.GET.get('q', '').strip()
+    paginator = SearchPaginator(query, NUMBER_OF_POSTS)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('cursor')),
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
@@ -70,14 +176,17 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if post.image:
+            thumbnails.schedule(post.image)
         return redirect('posts:profile', request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    if post.author != request.user:
+    post = get_object_or_404(
+        Post.objects.select_related('group'), pk=post_id)
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
         request.POST or None,
@@ -85,9 +194,15 @@ def post_edit(request, post_id):
         instance=post,
     )
     if form.is_valid():
+        # Сохраняем только поля формы, чтобы не затереть счётчики,
+        # изменённые конкурентными запросами.
         post = form.save(commit=False)
-        post.author = request.user
-        post.save()
+        fields = list(form.Meta.fields)
+        if 'image' in form.changed_data:
+            fields += IMAGE_DERIVED_FIELDS
+        post.save(update_fields=fields)
+        if 'image' in form.changed_data and post.image:
+            thumbnails.schedule(post.image)
         return redirect('posts:post_detail', post.id)
     context = {
         'form': form,
@@ -106,16 +221,55 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        # Новые комментарии показываются первыми, поэтому комментарий
+        # оказывается на первой странице под постом.
+        return redirect(reverse('posts:post_detail', args=[post_id])
+                        + f'#comment-{comment.pk}')
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@conditional(lambda request: [generations.follow_feed(request.user.pk)])
 def follow_index(request):
-    subscriptions = Follow.objects.filter(
-        user=request.user).values_list('author_id', flat=True)
-    result_quary = Post.objects.filter(author_id__in=subscriptions)
-    page_obj = get_pagination(request, result_quary)
-    return render(request, 'posts/follow.html', {'page_obj': page_obj})
+    if settings.POSTS_FOLLOW_FEED == 'timeline':
+        page_obj = get_pagination(
+            request, timeline.feed(request.user).for_feed())
+    elif settings.POSTS_FOLLOW_FEED == 'merge':
+        page_obj = get_pagination(request, pull_feed.MergedFeed(request.user))
+    else:
+        subscriptions = Follow.objects.filter(
+            user=request.user).values_list('author_id', flat=True)
+        result_quary = Post.objects.for_feed().filter(
+            author_id__in=subscriptions)
+        page_obj = get_pagination(request, result_quary,
+                                  counters.follow_key(request.user.pk))
+    context = feed_context(
+        page_obj, generations.follow_feed(request.user.pk))
+    return render(request, 'posts/follow.html', context)
+
+
+@login_required
+def export(request):
+    """Все посты, комментарии и подписки пользователя в JSON Lines.
+
+    Ответ отдаётся потоком: строки читаются из базы пачками по мере
+    отправки, поэтому память не зависит от размера аккаунта.
+    """
+    user = request.user
+    lines = transfer.export_lines(
+        groups=Group.objects.filter(
+            pk__in=user.posts.values('group_id')),
+        posts=user.posts.all(),
+        comments=user.comments.all(),
+        follows=Follow.objects.filter(Q(user=user) | Q(author=user)),
+    )
+    response = StreamingHttpResponse(
+        transfer.byte_chunks(lines),
+        content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-{user.pk}.jsonl"')
+    response['Cache-Control'] = 'private, no-store'
+    return response
 
 
 @login_required
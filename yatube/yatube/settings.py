@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -53,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -153,8 +157,114 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Каталог для файлов, которые пишет запущенный проект (общий кэш, журнал
+# медленных запросов): вне исходников, задаётся переменной YATUBE_RUN_DIR.
+RUN_DIR = os.environ.get(
+    'YATUBE_RUN_DIR', os.path.join(tempfile.gettempdir(), 'yatube'))
+# Кэш в файле SQLite общий для всех воркеров: сброс версий и счётчиков в
+# одном процессе сразу виден остальным. Тесты работают с LocMemCache, чтобы
+# не делить файл с запущенным сервером.
+TESTING = 'test' in sys.argv or 'pytest' in sys.modules
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    os.makedirs(RUN_DIR, exist_ok=True)
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': os.path.join(RUN_DIR, 'cache.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
     }
+
+# Курсорная пагинация лент (?cursor=...) вместо номеров страниц: не делает
+# COUNT(*) и OFFSET, глубокие страницы стоят столько же, сколько первая.
+# Запрос с параметром cursor обслуживается курсором при любом значении.
+POSTS_CURSOR_PAGINATION = False
+
+# Время жизни закэшированных счётчиков лент (posts.counters), секунды.
+# Ограничивает срок, в течение которого счётчик может расходиться с базой.
+POSTS_FEED_COUNT_TIMEOUT = 60 * 60
+
+# Способ построения ленты подписок (follow_index):
+# 'timeline' — материализованная лента posts.TimelineEntry, заполняемая
+# при публикации поста; 'merge' — слияние закэшированных списков последних
+# постов каждого автора (posts.pull_feed); 'subquery' — выборка постов
+# по подзапросу к Follow.
+POSTS_FOLLOW_FEED = 'timeline'
+# Максимальная длина материализованной ленты одного пользователя.
+POSTS_TIMELINE_LENGTH = 1000
+# Сколько последних постов автора хранить в кэше для режима 'merge'
+# и сколько секунд держать этот список.
+POSTS_RECENT_POSTS_LENGTH = 200
+POSTS_RECENT_POSTS_TIMEOUT = 60 * 60
+
+# Время жизни закэшированных фрагментов лент, секунды. Ключи фрагментов
+# содержат версию тега ленты (posts.generations), которое меняется при каждой
+# записи, поэтому устаревшие фрагменты не показываются.
+POSTS_FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Время жизни страниц, закэшированных для анонимных посетителей
+# (core.middleware.AnonymousPageCacheMiddleware), секунды. Запись сбрасывается
+# раньше, как только меняется версия любого из её тегов (core.cache_tags).
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Порог медленного запроса (core.middleware.RequestMetricsMiddleware):
+# время в миллисекундах или число SQL-запросов. Медленные запросы пишутся
+# в журнал JSON lines вместе с EXPLAIN стольких самых долгих SQL-запросов.
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_QUERIES = 30
+SLOW_REQUEST_EXPLAIN = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(RUN_DIR, 'slow_requests.jsonl'),
+            'formatter': 'message',
+            'delay': True,
+        } if not TESTING else {'class': 'logging.NullHandler'},
+    },
+    'loggers': {
+        'core.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Фоновые задачи core.jobs выполняются сразу, без очереди (для тестов).
+JOBS_EAGER = TESTING
+
+# Размеры миниатюр картинок постов: имя -> (геометрия, опции sorl).
+# Миниатюры строятся в фоне при сохранении поста (posts.thumbnails).
+POSTS_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Более узкие варианты размеров для srcset: имя -> ширины. Строятся только
+# ширины меньше исходной картинки, так что на одну картинку приходится не
+# больше len(ширин) + 1 миниатюр.
+POSTS_THUMBNAIL_WIDTHS = {
+    'card': (320, 480, 640),
 }
+
+# Приём картинок постов (posts.images): больше стольких пикселей картинка
+# отклоняется, длинная сторона уменьшается до POSTS_IMAGE_MAX_SIZE, качество
+# перекодирования — POSTS_IMAGE_QUALITY.
+POSTS_IMAGE_MAX_PIXELS = 40_000_000
+POSTS_IMAGE_MAX_SIZE = 2048
+POSTS_IMAGE_QUALITY = 85
+# Столько секунд после того, как одинаковая загрузка переиспользовала файл
+# картинки, он не удаляется вместе с последним ссылавшимся постом: пост
+# новой загрузки может быть ещё не зафиксирован.
+POSTS_IMAGE_RELEASE_GRACE = 300
@@ -17,6 +17,8 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
+
+from core.views import media
 from django.conf import settings
 
 urlpatterns = [
@@ -32,8 +34,10 @@ handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
 
 if settings.DEBUG:
+    # В продакшене media раздаёт веб-сервер: для файлов с именем-хешем
+    # он должен отдавать тот же Cache-Control, что и core.views.media.
     urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
+        settings.MEDIA_URL, view=media, document_root=settings.MEDIA_ROOT
     )
     import debug_toolbar
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)